@@ -1,24 +1,74 @@
 import os
+from core import config
+from core.libs import db_pool
+from core.libs.replicas import RoutingSQLAlchemy
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from sqlalchemy import event
 from sqlalchemy.engine import Engine
 from sqlite3 import Connection as SQLite3Connection
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///./store.sqlite3')
-app.config['SQLALCHEMY_ECHO'] = False
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-app.test_client()
+db = RoutingSQLAlchemy()
+
+
+def create_app(app_config=None):
+    """
+    Builds the app, `app_config` overrides its Flask config. The blueprints and their schemas are only
+    imported here, and Flask-Migrate only when a `flask db` command runs, so importing core stays cheap.
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///./store.sqlite3')
+    app.config['SQLALCHEMY_ECHO'] = False
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.update(app_config or {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', db_pool.engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+
+    db.init_replicas(app, config.DATABASE_REPLICA_URLS, check_interval=config.DATABASE_REPLICA_CHECK_INTERVAL)
+    db.init_app(app)
+    app.extensions['migrate'] = _DeferredMigrate(app, db)
+
+    from core import routes
+    routes.init_app(app)
+    return app
+
+
+class _DeferredMigrate:
+    """Stands in for Flask-Migrate's extension until a `flask db` command reads it, serving never imports alembic"""
+
+    def __init__(self, app, db):
+        self._app = app
+        self._db = db
+
+    def __getattr__(self, name):
+        from flask_migrate import Migrate
+        Migrate(self._app, self._db)
+        return getattr(self._app.extensions['migrate'], name)
+
+
+def __getattr__(name):
+    # `from core import app` is the app served by gunicorn, created on first use
+    if name == 'app':
+        from core.server import app
+        return app
+    raise AttributeError('module {0!r} has no attribute {1!r}'.format(__name__, name))
+
+
+SQLITE_PRAGMAS = [
+    # this is to enforce fk (not done by default in sqlite3)
+    ('foreign_keys', 'ON'),
+    ('journal_mode', config.SQLITE_JOURNAL_MODE),
+    ('synchronous', config.SQLITE_SYNCHRONOUS),
+    ('mmap_size', config.SQLITE_MMAP_SIZE),
+    ('cache_size', config.SQLITE_CACHE_SIZE),
+    ('temp_store', config.SQLITE_TEMP_STORE),
+    ('busy_timeout', config.SQLITE_BUSY_TIMEOUT),
+]
 
 
-# this is to enforce fk (not done by default in sqlite3)
 @event.listens_for(Engine, "connect")
 def _set_sqlite_pragma(dbapi_connection, connection_record):
     if isinstance(dbapi_connection, SQLite3Connection):
         cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON;")
+        for name, value in SQLITE_PRAGMAS:
+            if value:
+                cursor.execute("PRAGMA {0}={1};".format(name, value))
         cursor.close()
@@ -1,25 +1,38 @@
+import time
 from flask import Blueprint
 from core import db
 from core.apis import decorators
 from core.apis.responses import APIResponse
-from core.apis.teachers.schema import TeacherSchema
+from core.apis.teachers.schema import teacher_serializer
 from core.models.assignments import Assignment
+from core.models.grading_stats import GradingStats
 from core.models.teachers import Teacher
-from .schema import AssignmentSchema, AssignmentGradeSchema
+from .schema import AssignmentGradeSchema, assignment_serializer, load_batch
 
 principal_assignments_resources = Blueprint('principal_assignments_resources', __name__)
 
 @principal_assignments_resources.route('/assignments', methods=['GET'], strict_slashes=False)
 @decorators.authenticate_principal
-def list_assignments(p):
+@decorators.rate_limited(cost=1)
+@decorators.accept_pagination
+def list_assignments(p, page_request):
     """Returns list of submitted and graded assignments"""
-    assignments = Assignment.get_submitted_and_graded_assignments()
-    assignments_dump = AssignmentSchema().dump(assignments, many=True)
-    return APIResponse.respond(data=assignments_dump)
+    assignments_page = Assignment.get_submitted_and_graded_assignments(page_request)
+    etag = APIResponse.make_etag(assignments_page.validator())
+    if APIResponse.is_not_modified(etag):
+        return APIResponse.not_modified(etag)
+
+    if APIResponse.wants_stream():
+        return APIResponse.stream(assignments_page.stream(), assignment_serializer.dumper(assignments_page.fields), etag=etag)
+
+    assignments_dump = assignment_serializer.dump_many(assignments_page.items, only=assignments_page.fields)
+    return APIResponse.respond_page(data=assignments_dump, next_cursor=assignments_page.next_cursor, etag=etag)
 
 @principal_assignments_resources.route('/assignments/grade', methods=['POST'], strict_slashes=False)
 @decorators.accept_payload
 @decorators.authenticate_principal
+@decorators.rate_limited(cost=1)
+@decorators.idempotent
 def grade_assignment(p, incoming_payload):
     """Grade or re-grade an assignment"""
     grade_assignment_payload = AssignmentGradeSchema().load(incoming_payload)
@@ -30,14 +43,59 @@ def grade_assignment(p, incoming_payload):
         auth_principal=p
     )
     db.session.commit()
-    graded_assignment_dump = AssignmentSchema().dump(graded_assignment)
+    graded_assignment_dump = assignment_serializer.dump(graded_assignment)
     return APIResponse.respond(data=graded_assignment_dump)
 
+@principal_assignments_resources.route('/assignments/grade/bulk', methods=['POST'], strict_slashes=False)
+@decorators.accept_payload
+@decorators.authenticate_principal
+@decorators.rate_limited(cost=10)
+@decorators.idempotent
+def bulk_grade_assignments(p, incoming_payload):
+    """Grade or re-grade a batch of assignments in one transaction"""
+    grade_assignment_payloads, failures = load_batch(AssignmentGradeSchema(), incoming_payload, unique_key='id')
+
+    graded_assignments, grading_failures = Assignment.bulk_principal_mark_grade(
+        grades=[(payload.id, payload.grade) for payload in grade_assignment_payloads],
+        auth_principal=p
+    )
+    # dumped before the commit expires them, which would read every row back with a query of its own
+    graded_assignments_dump = assignment_serializer.dump_many(graded_assignments)
+    db.session.commit()
+    return APIResponse.respond(data={
+        'graded': graded_assignments_dump,
+        'failures': failures + grading_failures
+    })
+
 
 @principal_assignments_resources.route('/teachers', methods=['GET'], strict_slashes=False)
 @decorators.authenticate_principal
+@decorators.rate_limited(cost=1)
 def list_teachers(p):
     """Returns list of all teachers"""
-    teachers = Teacher.get_all()
-    teachers_dump = TeacherSchema(many=True).dump(teachers)
-    return APIResponse.respond(data=teachers_dump)
\ No newline at end of file
+    teachers_body = Teacher.cache.get('all')
+    if teachers_body is None:
+        teachers = Teacher.get_all()
+        teachers_body = APIResponse.encode(data=teacher_serializer.dump_many(teachers))
+        Teacher.cache.set('all', teachers_body)
+    return APIResponse.respond_encoded(teachers_body)
+
+
+@principal_assignments_resources.route('/stats', methods=['GET'], strict_slashes=False)
+@decorators.authenticate_principal
+@decorators.rate_limited(cost=1)
+def get_stats(p):
+    """Returns assignment counts by state and grade per teacher and per student"""
+    stats_body = GradingStats.cache.get('summary')
+    if stats_body is None:
+        started_at = time.perf_counter()
+        summary = GradingStats.get_summary()
+        # in a header, the cached body would report the time of the request that computed it to every hit
+        stats_timing = 'stats;dur={0:.3f};desc="computed"'.format((time.perf_counter() - started_at) * 1000)
+        stats_body = APIResponse.encode(data=summary)
+        GradingStats.cache.set('summary', stats_body)
+    else:
+        stats_timing = 'stats;desc="cached"'
+    response = APIResponse.respond_encoded(stats_body)
+    response.headers['Server-Timing'] = stats_timing
+    return response
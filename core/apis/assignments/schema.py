@@ -1,8 +1,12 @@
-from marshmallow import Schema, EXCLUDE, fields, post_load
+from marshmallow import Schema, EXCLUDE, ValidationError, fields, post_load
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema, auto_field
 from marshmallow_enum import EnumField
 from core.models.assignments import Assignment, GradeEnum
+from core.libs import assertions
 from core.libs.helpers import GeneralObject
+from core.libs.serializers import ModelSerializer
+
+BATCH_MAX_SIZE = 1000
 
 
 class AssignmentSchema(SQLAlchemyAutoSchema):
@@ -25,6 +29,14 @@ class AssignmentSchema(SQLAlchemyAutoSchema):
         return Assignment(**data_dict)
 
 
+class AssignmentBulkSchema(AssignmentSchema):
+    content = auto_field(required=True, allow_none=False)
+
+
+# dump-side equivalent of AssignmentSchema, used on the read paths
+assignment_serializer = ModelSerializer(Assignment)
+
+
 class AssignmentSubmitSchema(Schema):
     class Meta:
         unknown = EXCLUDE
@@ -49,3 +61,40 @@ class AssignmentGradeSchema(Schema):
     def initiate_class(self, data_dict, many, partial):
         # pylint: disable=unused-argument,no-self-use
         return GeneralObject(**data_dict)
+
+
+def load_batch(schema, items, unique_key=None):
+    """
+    Loads a list payload in one pass, items that fail validation or repeat `unique_key` are left out.
+    Returns the loaded items and one failure entry per rejected item.
+    """
+    assertions.assert_valid(isinstance(items, list), 'payload should be a list')
+    assertions.assert_valid(len(items) <= BATCH_MAX_SIZE,
+                            'a batch can have at most {0} items'.format(BATCH_MAX_SIZE))
+
+    try:
+        loaded, errors = schema.load(items, many=True), {}
+    except ValidationError as err:
+        loaded, errors = None, err.messages
+
+    failures = [
+        {'index': index, 'error': 'ValidationError', 'message': messages}
+        for index, messages in sorted(errors.items())
+    ]
+    valid_indexes = [index for index in range(len(items)) if index not in errors]
+    if loaded is None:
+        loaded = schema.load([items[index] for index in valid_indexes], many=True)
+
+    # compared after loading, so that "1" and 1 are the same id
+    unique_items = []
+    seen_keys = set()
+    for index, item in zip(valid_indexes, loaded):
+        key = getattr(item, unique_key, None) if unique_key else None
+        if key is not None:
+            if key in seen_keys:
+                failures.append({'index': index, 'error': 'ValidationError',
+                                 'message': 'duplicate {0} in batch'.format(unique_key)})
+                continue
+            seen_keys.add(key)
+        unique_items.append(item)
+    return unique_items, failures
@@ -4,22 +4,33 @@ from core.apis import decorators
 from core.apis.responses import APIResponse
 from core.models.assignments import Assignment
 
-from .schema import AssignmentSchema, AssignmentSubmitSchema
+from .schema import AssignmentSchema, AssignmentBulkSchema, AssignmentSubmitSchema, assignment_serializer, load_batch
 student_assignments_resources = Blueprint('student_assignments_resources', __name__)
 
 
 @student_assignments_resources.route('/assignments', methods=['GET'], strict_slashes=False)
 @decorators.authenticate_principal
-def list_assignments(p):
+@decorators.rate_limited(cost=1)
+@decorators.accept_pagination
+def list_assignments(p, page_request):
     """Returns list of assignments"""
-    students_assignments = Assignment.get_assignments_by_student(p.student_id)
-    students_assignments_dump = AssignmentSchema().dump(students_assignments, many=True)
-    return APIResponse.respond(data=students_assignments_dump)
+    students_assignments_page = Assignment.get_assignments_by_student(p.student_id, page_request)
+    etag = APIResponse.make_etag(students_assignments_page.validator())
+    if APIResponse.is_not_modified(etag):
+        return APIResponse.not_modified(etag)
+
+    if APIResponse.wants_stream():
+        return APIResponse.stream(students_assignments_page.stream(), assignment_serializer.dumper(students_assignments_page.fields), etag=etag)
+
+    students_assignments_dump = assignment_serializer.dump_many(students_assignments_page.items, only=students_assignments_page.fields)
+    return APIResponse.respond_page(data=students_assignments_dump, next_cursor=students_assignments_page.next_cursor, etag=etag)
 
 
 @student_assignments_resources.route('/assignments', methods=['POST'], strict_slashes=False)
 @decorators.accept_payload
 @decorators.authenticate_principal
+@decorators.rate_limited(cost=1)
+@decorators.idempotent
 def upsert_assignment(p, incoming_payload):
     """Create or Edit an assignment"""
     assignment = AssignmentSchema().load(incoming_payload)
@@ -27,13 +38,34 @@ def upsert_assignment(p, incoming_payload):
 
     upserted_assignment = Assignment.upsert(assignment)
     db.session.commit()
-    upserted_assignment_dump = AssignmentSchema().dump(upserted_assignment)
+    upserted_assignment_dump = assignment_serializer.dump(upserted_assignment)
     return APIResponse.respond(data=upserted_assignment_dump)
 
 
+@student_assignments_resources.route('/assignments/bulk', methods=['POST'], strict_slashes=False)
+@decorators.accept_payload
+@decorators.authenticate_principal
+@decorators.rate_limited(cost=10)
+@decorators.idempotent
+def bulk_upsert_assignments(p, incoming_payload):
+    """Create or Edit a batch of assignments in one transaction"""
+    assignments, failures = load_batch(AssignmentBulkSchema(), incoming_payload, unique_key='id')
+
+    upserted_assignments, upsert_failures = Assignment.bulk_upsert(assignments, auth_principal=p)
+    # dumped before the commit expires them, which would read every row back with a query of its own
+    upserted_assignments_dump = assignment_serializer.dump_many(upserted_assignments)
+    db.session.commit()
+    return APIResponse.respond(data={
+        'upserted': upserted_assignments_dump,
+        'failures': failures + upsert_failures
+    })
+
+
 @student_assignments_resources.route('/assignments/submit', methods=['POST'], strict_slashes=False)
 @decorators.accept_payload
 @decorators.authenticate_principal
+@decorators.rate_limited(cost=1)
+@decorators.idempotent
 def submit_assignment(p, incoming_payload):
     """Submit an assignment"""
     submit_assignment_payload = AssignmentSubmitSchema().load(incoming_payload)
@@ -44,5 +76,27 @@ def submit_assignment(p, incoming_payload):
         auth_principal=p
     )
     db.session.commit()
-    submitted_assignment_dump = AssignmentSchema().dump(submitted_assignment)
+    submitted_assignment_dump = assignment_serializer.dump(submitted_assignment)
     return APIResponse.respond(data=submitted_assignment_dump)
+
+
+@student_assignments_resources.route('/assignments/submit/bulk', methods=['POST'], strict_slashes=False)
+@decorators.accept_payload
+@decorators.authenticate_principal
+@decorators.rate_limited(cost=10)
+@decorators.idempotent
+def bulk_submit_assignments(p, incoming_payload):
+    """Submit a batch of assignments in one transaction"""
+    submit_assignment_payloads, failures = load_batch(AssignmentSubmitSchema(), incoming_payload, unique_key='id')
+
+    submitted_assignments, submit_failures = Assignment.bulk_submit(
+        submissions=[(payload.id, payload.teacher_id) for payload in submit_assignment_payloads],
+        auth_principal=p
+    )
+    # dumped before the commit expires them, which would read every row back with a query of its own
+    submitted_assignments_dump = assignment_serializer.dump_many(submitted_assignments)
+    db.session.commit()
+    return APIResponse.respond(data={
+        'submitted': submitted_assignments_dump,
+        'failures': failures + submit_failures
+    })
@@ -4,22 +4,33 @@ from core.apis import decorators
 from core.apis.responses import APIResponse
 from core.models.assignments import Assignment
 
-from .schema import AssignmentSchema, AssignmentGradeSchema
+from .schema import AssignmentGradeSchema, assignment_serializer, load_batch
 teacher_assignments_resources = Blueprint('teacher_assignments_resources', __name__)
 
 
 @teacher_assignments_resources.route('/assignments', methods=['GET'], strict_slashes=False)
 @decorators.authenticate_principal
-def list_assignments(p):
+@decorators.rate_limited(cost=1)
+@decorators.accept_pagination
+def list_assignments(p, page_request):
     """Returns list of assignments"""
-    teachers_assignments = Assignment.get_assignments_by_teacher(p.teacher_id)
-    teachers_assignments_dump = AssignmentSchema().dump(teachers_assignments, many=True)
-    return APIResponse.respond(data=teachers_assignments_dump)
+    teachers_assignments_page = Assignment.get_assignments_by_teacher(p.teacher_id, page_request)
+    etag = APIResponse.make_etag(teachers_assignments_page.validator())
+    if APIResponse.is_not_modified(etag):
+        return APIResponse.not_modified(etag)
+
+    if APIResponse.wants_stream():
+        return APIResponse.stream(teachers_assignments_page.stream(), assignment_serializer.dumper(teachers_assignments_page.fields), etag=etag)
+
+    teachers_assignments_dump = assignment_serializer.dump_many(teachers_assignments_page.items, only=teachers_assignments_page.fields)
+    return APIResponse.respond_page(data=teachers_assignments_dump, next_cursor=teachers_assignments_page.next_cursor, etag=etag)
 
 
 @teacher_assignments_resources.route('/assignments/grade', methods=['POST'], strict_slashes=False)
 @decorators.accept_payload
 @decorators.authenticate_principal
+@decorators.rate_limited(cost=1)
+@decorators.idempotent
 def grade_assignment(p, incoming_payload):
     """Grade an assignment"""
     grade_assignment_payload = AssignmentGradeSchema().load(incoming_payload)
@@ -30,5 +41,27 @@ def grade_assignment(p, incoming_payload):
         auth_principal=p
     )
     db.session.commit()
-    graded_assignment_dump = AssignmentSchema().dump(graded_assignment)
+    graded_assignment_dump = assignment_serializer.dump(graded_assignment)
     return APIResponse.respond(data=graded_assignment_dump)
+
+
+@teacher_assignments_resources.route('/assignments/grade/bulk', methods=['POST'], strict_slashes=False)
+@decorators.accept_payload
+@decorators.authenticate_principal
+@decorators.rate_limited(cost=10)
+@decorators.idempotent
+def bulk_grade_assignments(p, incoming_payload):
+    """Grade a batch of assignments in one transaction"""
+    grade_assignment_payloads, failures = load_batch(AssignmentGradeSchema(), incoming_payload, unique_key='id')
+
+    graded_assignments, grading_failures = Assignment.bulk_mark_grade(
+        grades=[(payload.id, payload.grade) for payload in grade_assignment_payloads],
+        auth_principal=p
+    )
+    # dumped before the commit expires them, which would read every row back with a query of its own
+    graded_assignments_dump = assignment_serializer.dump_many(graded_assignments)
+    db.session.commit()
+    return APIResponse.respond(data={
+        'graded': graded_assignments_dump,
+        'failures': failures + grading_failures
+    })
@@ -1,8 +1,18 @@
 import json
-from flask import request
-from core.libs import assertions
+import math
+import re
+import time
+from flask import current_app, request
+from core import config, db
+from core.apis.responses import APIResponse
+from core.libs import assertions, pagination, rate_limit
+from core.libs.exceptions import RateLimitExceeded
+from core.libs.timing import serialize_span
+from core.models.idempotency_keys import IdempotencyKey
 from functools import wraps
 
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+
 
 class AuthPrincipal:
     def __init__(self, user_id, student_id=None, teacher_id=None, principal_id=None):
@@ -15,11 +25,35 @@ class AuthPrincipal:
 def accept_payload(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        incoming_payload = request.json
+        with serialize_span():
+            incoming_payload = request.json
         return func(incoming_payload, *args, **kwargs)
     return wrapper
 
 
+def accept_pagination(func):
+    """Passes the PageRequest of the query string after the principal, goes under authenticate_principal"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        limit = request.args.get('limit', str(pagination.DEFAULT_PAGE_SIZE))
+        # not isdigit(), which also passes digits that int() does not parse, like '²'
+        assertions.assert_valid(re.fullmatch('[0-9]+', limit) is not None
+                                and 0 < int(limit) <= pagination.MAX_PAGE_SIZE,
+                                'limit should be between 1 and {0}'.format(pagination.MAX_PAGE_SIZE))
+        cursor = request.args.get('cursor')
+        fields = request.args.get('fields')
+        if fields:
+            fields = [field.strip() for field in fields.split(',')]
+            assertions.assert_valid(all(fields), 'fields should be a comma separated list of field names')
+        page_request = pagination.PageRequest(
+            limit=int(limit),
+            cursor=pagination.decode_cursor(cursor) if cursor else None,
+            fields=fields or None
+        )
+        return func(*args, page_request, **kwargs)
+    return wrapper
+
+
 def authenticate_principal(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
@@ -44,3 +78,77 @@ def authenticate_principal(func):
 
         return func(p, *args, **kwargs)
     return wrapper
+
+
+def _wait_for_response(user_id, key, fingerprint):
+    """
+    Takes the key and returns None, or returns the row with the response stored for it, polling while
+    the request holding the key is running
+    """
+    deadline = time.monotonic() + config.IDEMPOTENCY_WAIT_TIMEOUT
+    delay = 0.02
+    while True:
+        stored = IdempotencyKey.claim(user_id, key, fingerprint, config.IDEMPOTENCY_LOCK_TIMEOUT)
+        if stored is None:
+            return None
+        assertions.assert_valid(stored.fingerprint == fingerprint,
+                                '{0} was already used with a different request'.format(IDEMPOTENCY_KEY_HEADER))
+        if stored.status_code is not None:
+            return stored
+        if time.monotonic() + delay > deadline:
+            assertions.base_assert(409, 'a request with this {0} is still in progress'.format(IDEMPOTENCY_KEY_HEADER))
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+
+def idempotent(func):
+    """
+    Runs the handler once per Idempotency-Key of a user and replays its response to the retries.
+    A retry of a request still running waits for it. Goes under authenticate_principal.
+    """
+    @wraps(func)
+    def wrapper(p, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+        if key is None:
+            return func(p, *args, **kwargs)
+        assertions.assert_valid(0 < len(key) <= 255, '{0} should be 1 to 255 characters'.format(IDEMPOTENCY_KEY_HEADER))
+
+        fingerprint = IdempotencyKey.fingerprint_of(request.method, request.path, request.get_data())
+        stored = _wait_for_response(p.user_id, key, fingerprint)
+        if stored is not None:
+            response = APIResponse(stored.body, status=stored.status_code, mimetype='application/json')
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = current_app.make_response(func(p, *args, **kwargs))
+        except Exception:
+            # ends the handler's transaction first, on SQLite it would hold the write lock the release needs
+            db.session.rollback()
+            IdempotencyKey.release(p.user_id, key)
+            raise
+        if response.status_code >= 500 or response.is_streamed:
+            IdempotencyKey.release(p.user_id, key)
+        else:
+            IdempotencyKey.complete(p.user_id, key, response.status_code, response.get_data(),
+                                    config.IDEMPOTENCY_KEY_TTL)
+        return response
+    return wrapper
+
+
+def rate_limited(cost=1):
+    """
+    Takes `cost` tokens from the bucket of the requester, see core/libs/rate_limit.py.
+    Goes under authenticate_principal, a no-op unless RATE_LIMIT_FILE is set.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(p, *args, **kwargs):
+            limiter = rate_limit.get_limiter()
+            if limiter is not None:
+                retry_after = limiter.take(p.user_id, cost)
+                if retry_after:
+                    raise RateLimitExceeded(math.ceil(retry_after))
+            return func(p, *args, **kwargs)
+        return wrapper
+    return decorator
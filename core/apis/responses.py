@@ -1,7 +1,93 @@
-from flask import Response, jsonify, make_response
+import hashlib
+from core import config
+from core.libs import compression, json_encoders
+from core.libs.timing import serialize_span
+from flask import Response, request, stream_with_context
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
 
 
 class APIResponse(Response):
+    # see JSON_ENCODER in core/config.py
+    json_encoder = json_encoders.get_encoder(config.JSON_ENCODER)
+
+    @classmethod
+    def _json(cls, payload, status=200):
+        with serialize_span():
+            return cls(cls.json_encoder.encode_bytes(payload), status=status, mimetype='application/json')
+
+    @classmethod
+    def respond(cls, data, etag=None):
+        response = cls._json({'data': data})
+        if etag is not None:
+            response.set_etag(etag, weak=True)
+        return response
+
+    @classmethod
+    def respond_page(cls, data, next_cursor, etag=None):
+        response = cls._json({'data': data, 'next_cursor': next_cursor})
+        if etag is not None:
+            response.set_etag(etag, weak=True)
+        return response
+
+    @classmethod
+    def respond_error(cls, error, message, status):
+        return cls._json({'error': error, 'message': message}, status=status)
+
+    @classmethod
+    def encode(cls, data):
+        """Body that `respond(data)` would send, for callers that cache it along with its compressed variants"""
+        with serialize_span():
+            return compression.PrecompressedBody(cls.json_encoder.encode_bytes({'data': data}))
+
     @classmethod
-    def respond(cls, data):
-        return make_response(jsonify(data=data))
+    def respond_encoded(cls, body):
+        response = cls(body.data, mimetype='application/json')
+        compressor = compression.get_compressor()
+        if compressor is not None:
+            with serialize_span():
+                compressor.respond_precompressed(response, body)
+        return response
+
+    @classmethod
+    def make_etag(cls, validator):
+        """
+        Builds an etag from a cheap validator of the data behind this request, e.g. (count, max(updated_at)).
+        The requester, query string and Accept header are part of it since they select what is sent.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for part in (request.full_path, request.headers.get('X-Principal', ''), request.headers.get('Accept', ''),
+                     *validator):
+            digest.update(str(part).encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    @classmethod
+    def is_not_modified(cls, etag):
+        return request.if_none_match.contains_weak(etag)
+
+    @classmethod
+    def not_modified(cls, etag):
+        response = cls(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    @classmethod
+    def wants_stream(cls):
+        if request.args.get('stream') in ('1', 'true'):
+            return True
+        return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+    @classmethod
+    def stream(cls, rows, serialize, etag=None):
+        """Writes one JSON document per row, rows are pulled from the iterable as the client reads"""
+        encode_bytes = cls.json_encoder.encode_bytes
+
+        def generate():
+            for row in rows:
+                yield encode_bytes(serialize(row))
+
+        response = cls(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+        if etag is not None:
+            response.set_etag(etag, weak=True)
+        return response
@@ -1,4 +1,5 @@
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema, auto_field
+from core.libs.serializers import ModelSerializer
 from core.models.teachers import Teacher
 
 class TeacherSchema(SQLAlchemyAutoSchema):
@@ -7,4 +8,8 @@ class TeacherSchema(SQLAlchemyAutoSchema):
         include_relationships = True
         load_instance = True
 
-    user_id = auto_field()
\ No newline at end of file
+    user_id = auto_field()
+
+
+# dump-side equivalent of TeacherSchema, used on the read paths
+teacher_serializer = ModelSerializer(Teacher)
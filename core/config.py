@@ -0,0 +1,83 @@
+import os
+
+
+def _optional_int(name):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+# the gunicorn settings the app needs to know about, see gunicorn_config.py
+GUNICORN_WORKER_CLASS = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+GUNICORN_NUMBER_WORKER_CONNECTIONS = int(os.environ.get('GUNICORN_NUMBER_WORKER_CONNECTIONS', 20))
+
+# SQLALCHEMY_ENGINE_OPTIONS, see core/libs/db_pool.py. Unset values keep the SQLAlchemy
+# defaults, except under gevent where the pool is sized from worker_connections
+DB_POOL_SIZE = _optional_int('DB_POOL_SIZE')
+DB_MAX_OVERFLOW = _optional_int('DB_MAX_OVERFLOW')
+DB_POOL_TIMEOUT = _optional_int('DB_POOL_TIMEOUT')
+DB_POOL_RECYCLE = _optional_int('DB_POOL_RECYCLE')
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'false').lower() in ('1', 'true', 'yes')
+
+# comma separated read replica urls, GET requests of the api blueprints read from them, see core/libs/replicas.py
+DATABASE_REPLICA_URLS = [url for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url]
+DATABASE_REPLICA_CHECK_INTERVAL = int(os.environ.get('DATABASE_REPLICA_CHECK_INTERVAL', 10))
+
+# pragmas set on every new SQLite connection, see core/__init__.py. Set one to an empty string to keep the
+# SQLite default. WAL lets readers run alongside a writer, mmap serves page reads without a syscall each
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_MMAP_SIZE = os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))
+SQLITE_CACHE_SIZE = os.environ.get('SQLITE_CACHE_SIZE', str(-64 * 1024))  # negative is in KiB
+SQLITE_TEMP_STORE = os.environ.get('SQLITE_TEMP_STORE', 'MEMORY')
+SQLITE_BUSY_TIMEOUT = os.environ.get('SQLITE_BUSY_TIMEOUT', '5000')  # ms
+
+# Server-Timing header and access log fields with the SQL, serialization and handler time of each request
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+# statements slower than this are logged with their caller and route, unset to turn the log off.
+# A sample of them is EXPLAINed in the background, see core/libs/slow_queries.py
+SLOW_QUERY_THRESHOLD_MS = _optional_int('SLOW_QUERY_THRESHOLD_MS')
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.environ.get('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', 0.1))
+SLOW_QUERY_LOG_FILE = os.environ.get('SLOW_QUERY_LOG_FILE', 'slow_queries.log')
+
+# json encoder of APIResponse and the error handler: orjson, stdlib, or auto for orjson when it is installed.
+# See core/libs/json_encoders.py
+JSON_ENCODER = os.environ.get('JSON_ENCODER', 'auto')
+
+# Accept-Encoding negotiated compression of json responses, see core/libs/compression.py. Bodies smaller than
+# COMPRESSION_MIN_SIZE bytes are sent as they are. Levels are per coding: zstd 1-22, brotli 0-11, gzip 1-9
+COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_LEVELS = {
+    coding: int(os.environ[name]) for coding, name in
+    (('zstd', 'COMPRESSION_ZSTD_LEVEL'), ('br', 'COMPRESSION_BROTLI_LEVEL'), ('gzip', 'COMPRESSION_GZIP_LEVEL'))
+    if os.environ.get(name)
+}
+
+# responses stored for POSTs sent with an Idempotency-Key header, see core/models/idempotency_keys.py.
+# A retry waits up to IDEMPOTENCY_WAIT_TIMEOUT seconds for the request it repeats, which holds the key
+# for at most IDEMPOTENCY_LOCK_TIMEOUT seconds in case it dies before finishing
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', 60))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', 10))
+
+# token buckets per user shared by the workers through this file, see core/libs/rate_limit.py. gunicorn_config.py
+# sets it, unset (or empty) turns rate limiting off. A bucket holds RATE_LIMIT_CAPACITY tokens and gets
+# RATE_LIMIT_REFILL_RATE back per second, each route takes the cost given to decorators.rate_limited
+RATE_LIMIT_FILE = os.environ.get('RATE_LIMIT_FILE') or None
+RATE_LIMIT_CAPACITY = float(os.environ.get('RATE_LIMIT_CAPACITY', 60))
+RATE_LIMIT_REFILL_RATE = float(os.environ.get('RATE_LIMIT_REFILL_RATE', 10))
+
+# read-through cache of the /principal/stats response, see core/models/grading_stats.py
+GRADING_STATS_CACHE_TTL = int(os.environ.get('GRADING_STATS_CACHE_TTL', 60))
+
+# read-through cache of the serialized teacher roster, see core/models/teachers.py
+TEACHERS_CACHE_TTL = int(os.environ.get('TEACHERS_CACHE_TTL', 300))
+TEACHERS_CACHE_MAXSIZE = int(os.environ.get('TEACHERS_CACHE_MAXSIZE', 16))
+
+# directory shared by the gunicorn workers to broadcast cache invalidations, unset to keep caches per process
+CACHE_BROADCAST_DIR = os.environ.get('CACHE_BROADCAST_DIR')
+
+
+def cache_broadcast_path(name):
+    return os.path.join(CACHE_BROADCAST_DIR, name) if CACHE_BROADCAST_DIR else None
@@ -0,0 +1,70 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+BROADCAST_FILE_MAX_SIZE = 4096
+
+
+class TTLCache:
+    """
+    Process-local LRU cache, entries expire `ttl` seconds after being set.
+
+    If `broadcast_path` is given, `clear()` also touches that file and every process sharing it
+    drops its entries on the next lookup, which is how gunicorn workers learn about each other's writes.
+    """
+
+    def __init__(self, maxsize=128, ttl=300, broadcast_path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.broadcast_path = broadcast_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = self._read_generation()
+
+    def _read_generation(self):
+        if self.broadcast_path is None:
+            return None
+        try:
+            stat = os.stat(self.broadcast_path)
+        except FileNotFoundError:
+            return None
+        # every clear() changes the size, so the generation moves even if the mtime resolution is coarse
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def get(self, key):
+        if self.broadcast_path is not None:
+            generation = self._read_generation()
+            if generation != self._generation:
+                with self._lock:
+                    self._entries.clear()
+                    self._generation = generation
+                return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.broadcast_path is not None:
+            with open(self.broadcast_path, 'ab') as broadcast_file:
+                if broadcast_file.tell() >= BROADCAST_FILE_MAX_SIZE:
+                    broadcast_file.truncate(0)
+                broadcast_file.write(b'.')
+            self._generation = self._read_generation()
@@ -0,0 +1,116 @@
+"""
+Response compression negotiated through Accept-Encoding. zstd and brotli are used when their packages
+are installed, gzip always is. Bodies under the minimum size go out as they are, since a few hundred
+bytes of JSON do not shrink enough to pay for the CPU.
+"""
+import gzip
+from core.libs.timing import serialize_span
+from flask import current_app, request
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson')
+
+
+def _zstd(body, level):
+    return zstandard.ZstdCompressor(level=level).compress(body)
+
+
+def _brotli(body, level):
+    return brotli.compress(body, quality=level, mode=brotli.MODE_TEXT)
+
+
+def _gzip(body, level):
+    # mtime=0 so the same body always compresses to the same bytes
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+# in order of preference when the client accepts several at the same quality
+CODINGS = {}
+if zstandard is not None:
+    CODINGS['zstd'] = _zstd
+if brotli is not None:
+    CODINGS['br'] = _brotli
+CODINGS['gzip'] = _gzip
+
+DEFAULT_LEVELS = {'zstd': 3, 'br': 4, 'gzip': 6}
+
+
+class Compressor:
+    def __init__(self, min_size=1024, levels=None, codings=None):
+        self.min_size = min_size
+        self.levels = dict(DEFAULT_LEVELS, **(levels or {}))
+        self.codings = [coding for coding in (codings or CODINGS) if coding in CODINGS]
+
+    def negotiate(self):
+        """Content coding to use for the current request, None to send the body as it is"""
+        coding = request.accept_encodings.best_match(self.codings)
+        return coding if coding in CODINGS else None
+
+    def compress(self, body, coding):
+        return CODINGS[coding](body, self.levels[coding])
+
+    def _compressible(self, response):
+        return response.mimetype in COMPRESSIBLE_MIMETYPES and 200 <= response.status_code < 300 \
+            and response.status_code != 204 and 'Content-Encoding' not in response.headers
+
+    def respond_precompressed(self, response, body):
+        """Sets `response` to the variant of a PrecompressedBody the client accepts"""
+        if len(body.data) < self.min_size:
+            return response
+        response.vary.add('Accept-Encoding')
+        coding = self.negotiate()
+        if coding is not None:
+            response.set_data(body.variant(coding, self))
+            response.headers['Content-Encoding'] = coding
+        return response
+
+    def after_request(self, response):
+        if response.direct_passthrough or response.is_streamed or not self._compressible(response):
+            # streamed bodies are written as the client reads, there is no size to check up front
+            return response
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+        response.vary.add('Accept-Encoding')
+        coding = self.negotiate()
+        if coding is not None:
+            with serialize_span():
+                response.set_data(self.compress(data, coding))
+            response.headers['Content-Encoding'] = coding
+        return response
+
+
+class PrecompressedBody:
+    """Encoded response body kept in a cache along with its compressed variants, so each is made once"""
+
+    __slots__ = ('data', '_variants')
+
+    def __init__(self, data):
+        self.data = data
+        self._variants = {}
+
+    def variant(self, coding, compressor):
+        compressed = self._variants.get(coding)
+        if compressed is None:
+            compressed = self._variants[coding] = compressor.compress(self.data, coding)
+        return compressed
+
+
+def init_app(app, min_size=1024, levels=None):
+    compressor = app.extensions['compression'] = Compressor(min_size=min_size, levels=levels)
+    app.after_request(compressor.after_request)
+    return compressor
+
+
+def get_compressor():
+    """Compressor of the current app, None when it does not compress"""
+    return current_app.extensions.get('compression')
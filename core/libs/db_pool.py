@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from core import config
+from core.libs.green import is_green_worker_class
+from sqlalchemy import event, exc
+from sqlalchemy.pool import Pool, QueuePool
+
+
+class PoolStats:
+    """
+    Connection pool counters of this process, used to size the pool per worker.
+    `wait` is the time spent getting a connection out of the pool, including opening new ones.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # called with (seconds, timed_out) after every wait, see core/libs/metrics.py
+        self.wait_listeners = []
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.pid = os.getpid()
+            self.connects = 0
+            self.checkouts = 0
+            self.checked_out = 0
+            self.max_checked_out = 0
+            self.timeouts = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+
+    def record_connect(self):
+        with self._lock:
+            self.connects += 1
+
+    def record_checkout(self):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def record_checkin(self):
+        with self._lock:
+            self.checked_out -= 1
+
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+        for listener in self.wait_listeners:
+            listener(seconds, timed_out)
+
+    def snapshot(self, pool=None):
+        with self._lock:
+            stats = {
+                'pid': self.pid,
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'checked_out': self.checked_out,
+                'max_checked_out': self.max_checked_out,
+                'timeouts': self.timeouts,
+                'wait_ms_total': round(self.wait_total * 1000, 3),
+                'wait_ms_max': round(self.wait_max * 1000, 3),
+            }
+        if isinstance(pool, QueuePool):
+            stats.update(size=pool.size(), overflow=pool.overflow(), checked_in=pool.checkedin())
+        return stats
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedQueuePool(QueuePool):
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_stats.record_wait(time.perf_counter() - started_at, timed_out=True)
+            raise
+        pool_stats.record_wait(time.perf_counter() - started_at)
+        return connection
+
+
+@event.listens_for(Pool, 'connect')
+def _record_connect(dbapi_connection, connection_record):
+    connection_record.info['pid'] = os.getpid()
+    pool_stats.record_connect()
+
+
+@event.listens_for(Pool, 'checkout')
+def _record_checkout(dbapi_connection, connection_record, connection_proxy):
+    pid = os.getpid()
+    if connection_record.info.get('pid', pid) != pid:
+        # opened before the fork by the parent (the gunicorn master with preload_app), which still uses the
+        # socket. The connection is dropped without closing it, and the pool connects again for this process
+        connection_record.connection = connection_proxy.connection = None
+        raise exc.DisconnectionError('connection opened in pid {0}, checked out in pid {1}'.format(
+            connection_record.info['pid'], pid))
+    pool_stats.record_checkout()
+
+
+@event.listens_for(Pool, 'checkin')
+def _record_checkin(dbapi_connection, connection_record):
+    pool_stats.record_checkin()
+
+
+def engine_options(database_uri):
+    """SQLALCHEMY_ENGINE_OPTIONS from the DB_POOL_* settings, unset ones keep the SQLAlchemy defaults"""
+    options = {'pool_pre_ping': config.DB_POOL_PRE_PING}
+    if database_uri.startswith('sqlite'):
+        # file databases get a NullPool, there is nothing to size
+        return options
+
+    pool_size, max_overflow = config.DB_POOL_SIZE, config.DB_MAX_OVERFLOW
+    if is_green_worker_class(config.GUNICORN_WORKER_CLASS):
+        # every greenlet of a worker may hold a connection, extra ones wait instead of
+        # opening connections past what postgres allows
+        pool_size = config.GUNICORN_NUMBER_WORKER_CONNECTIONS if pool_size is None else pool_size
+        max_overflow = 0 if max_overflow is None else max_overflow
+
+    options['poolclass'] = InstrumentedQueuePool
+    for key, value in (('pool_size', pool_size), ('max_overflow', max_overflow),
+                       ('pool_timeout', config.DB_POOL_TIMEOUT), ('pool_recycle', config.DB_POOL_RECYCLE)):
+        if value is not None:
+            options[key] = value
+    return options
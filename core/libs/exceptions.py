@@ -10,3 +10,9 @@ class FyleError(Exception):
         res = dict()
         res['message'] = self.message
         return res
+
+
+class RateLimitExceeded(FyleError):
+    def __init__(self, retry_after):
+        FyleError.__init__(self, 429, 'rate limit exceeded, retry in {0} seconds'.format(retry_after))
+        self.retry_after = retry_after
@@ -0,0 +1,33 @@
+"""
+Cooperative I/O for the gevent worker class, see gunicorn_config.py.
+"""
+GREEN_WORKER_CLASSES = ('gevent', 'gunicorn.workers.ggevent.GeventWorker')
+
+
+def is_green_worker_class(worker_class):
+    return worker_class in GREEN_WORKER_CLASSES
+
+
+def _gevent_wait_callback(conn, timeout=None):
+    from gevent.socket import wait_read, wait_write
+    from psycopg2 import OperationalError, extensions
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise OperationalError('Bad result from poll: %r' % state)
+
+
+def patch_psycopg2():
+    """Makes psycopg2 yield to the gevent hub while waiting on postgres instead of blocking the worker"""
+    try:
+        from psycopg2 import extensions
+    except ImportError:
+        return
+    extensions.set_wait_callback(_gevent_wait_callback)
@@ -0,0 +1,109 @@
+"""
+Prometheus metrics. Under gunicorn every worker writes its values to mmap'ed files in
+PROMETHEUS_MULTIPROC_DIR (set up in gunicorn_config.py) and /metrics merges all of them,
+so a scrape sees the whole server whichever worker answers it.
+"""
+import os
+import time
+from core.libs.db_pool import pool_stats
+from flask import g, request
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import REGISTRY, multiprocess
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+REQUESTS = Counter('fyle_http_requests_total', 'Requests answered, by route and status code',
+                   ['route', 'method', 'status'])
+REQUEST_LATENCY = Histogram('fyle_http_request_duration_seconds', 'Time to produce a response, by route',
+                            ['route', 'method'],
+                            buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+IN_FLIGHT = Gauge('fyle_http_requests_in_flight', 'Requests being handled, by route', ['route'],
+                  multiprocess_mode='livesum')
+ERRORS = Counter('fyle_errors_total', 'Errors turned into responses by handle_error, by type', ['error'])
+
+DB_POOL_CHECKED_OUT = Gauge('fyle_db_pool_checked_out', 'Connections checked out of the pool',
+                            multiprocess_mode='livesum')
+DB_POOL_CONNECTS = Counter('fyle_db_pool_connects_total', 'New connections opened by the pool')
+DB_POOL_WAIT = Histogram('fyle_db_pool_wait_seconds', 'Time to get a connection out of the pool',
+                         buckets=(.0005, .001, .005, .01, .05, .1, .5, 1, 5, 30))
+DB_POOL_TIMEOUTS = Counter('fyle_db_pool_timeouts_total', 'Checkouts that gave up waiting for a connection')
+
+
+_children = {}
+
+
+def _child(metric, *labels):
+    # metric.labels() costs more than the update itself, keep the children it returns
+    child = _children.get((metric, labels))
+    if child is None:
+        child = _children[(metric, labels)] = metric.labels(*labels)
+    return child
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _start_request():
+    route = _route()
+    g._metrics_route = route
+    g._metrics_started_at = time.perf_counter()
+    _child(IN_FLIGHT, route).inc()
+
+
+def _record_response(response):
+    route = g.get('_metrics_route')
+    if route is not None:
+        _child(REQUEST_LATENCY, route, request.method).observe(time.perf_counter() - g._metrics_started_at)
+        _child(REQUESTS, route, request.method, response.status_code).inc()
+    return response
+
+
+def _finish_request(exc):
+    route = g.pop('_metrics_route', None)
+    if route is not None:
+        _child(IN_FLIGHT, route).dec()
+
+
+def record_error(err):
+    _child(ERRORS, err.__class__.__name__).inc()
+
+
+def record_pool_wait(seconds, timed_out):
+    DB_POOL_WAIT.observe(seconds)
+    if timed_out:
+        DB_POOL_TIMEOUTS.inc()
+
+
+@event.listens_for(Pool, 'connect')
+def _record_connect(dbapi_connection, connection_record):
+    DB_POOL_CONNECTS.inc()
+
+
+@event.listens_for(Pool, 'checkout')
+def _record_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_CHECKED_OUT.inc()
+
+
+@event.listens_for(Pool, 'checkin')
+def _record_checkin(dbapi_connection, connection_record):
+    DB_POOL_CHECKED_OUT.dec()
+
+
+def init_app(app):
+    if record_pool_wait not in pool_stats.wait_listeners:
+        pool_stats.wait_listeners.append(record_pool_wait)
+    app.before_request(_start_request)
+    app.after_request(_record_response)
+    app.teardown_request(_finish_request)
+
+
+def exposition():
+    """(body, content type) of a scrape, merged across workers in multiprocess mode"""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
@@ -0,0 +1,99 @@
+import base64
+from datetime import datetime
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import load_only
+from core.libs import assertions
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 500
+
+
+class PageRequest:
+    def __init__(self, limit=DEFAULT_PAGE_SIZE, cursor=None, fields=None):
+        self.limit = limit
+        self.cursor = cursor
+        self.fields = fields
+
+
+def encode_cursor(updated_at, _id):
+    raw = '{0}|{1}'.format(updated_at.isoformat(), _id)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        updated_at, _id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(updated_at), int(_id)
+    except (ValueError, UnicodeError):
+        assertions.assert_valid(False, 'invalid cursor')
+
+
+class KeysetPage:
+    """
+    A page of rows ordered by (updated_at, id), resumed from an opaque cursor.
+    Rows are fetched lazily, one extra row is read to know whether a next page exists.
+    """
+
+    def __init__(self, query, model, page_request: PageRequest, caller):
+        # the rows are read after the model method that built the page returns, its statements are
+        # tagged with `caller`, the name of that method, for the slow query log
+        self.query = query.execution_options(caller=caller)
+        self.model = model
+        self.page_request = page_request
+        self.fields = self._checked_fields(model, page_request.fields)
+        self._items = None
+        self._next_cursor = None
+
+    @staticmethod
+    def _checked_fields(model, fields):
+        if fields is None:
+            return None
+        columns = model.__table__.columns.keys()
+        unknown = [field for field in fields if field not in columns]
+        assertions.assert_valid(not unknown, 'unknown fields: {0}'.format(', '.join(unknown)))
+        # in column order, so the same set of fields always gives the same projection
+        return tuple(column for column in columns if column in fields)
+
+    def _ordered_query(self):
+        model = self.model
+        query = self.query.order_by(model.updated_at, model.id)
+        if self.fields is not None:
+            # the keyset columns are needed for the cursor even when they are not asked for
+            query = query.options(load_only(*{*self.fields, 'id', 'updated_at'}))
+        if self.page_request.cursor is not None:
+            updated_at, _id = self.page_request.cursor
+            query = query.filter(or_(
+                model.updated_at > updated_at,
+                and_(model.updated_at == updated_at, model.id > _id)
+            ))
+        return query
+
+    def _fetch(self):
+        limit = self.page_request.limit
+        rows = self._ordered_query().limit(limit + 1).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            self._next_cursor = encode_cursor(rows[-1].updated_at, rows[-1].id)
+        self._items = rows
+
+    @property
+    def items(self):
+        if self._items is None:
+            self._fetch()
+        return self._items
+
+    @property
+    def next_cursor(self):
+        if self._items is None:
+            self._fetch()
+        return self._next_cursor
+
+    def stream(self, batch_size=STREAM_BATCH_SIZE):
+        """Yields every row after the cursor, ignoring the page limit, fetching `batch_size` rows at a time"""
+        return self._ordered_query().yield_per(batch_size)
+
+    def validator(self):
+        """(row count, latest updated_at) of the whole result, changes whenever any row of it is written"""
+        return self.query.order_by(None).with_entities(func.count(self.model.id), func.max(self.model.updated_at)).one()
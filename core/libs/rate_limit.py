@@ -0,0 +1,88 @@
+"""
+Token buckets per requester, kept in a memory mapped file so that every gunicorn worker takes from the same ones.
+
+The file is an array of groups of `SLOTS_PER_GROUP` slots, a requester's bucket lives in the group its key
+hashes to. A check locks that group's bytes with fcntl (and a lock of the process, fcntl locks do not
+exclude threads of one process), reads and writes 32 bytes and unlocks, a few microseconds in all.
+A bucket that has refilled completely holds nothing worth keeping, its slot is reused by another key.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from flask import current_app
+
+# key digest, tokens, time of the last update
+_SLOT = struct.Struct('<16sdd')
+SLOTS_PER_GROUP = 4
+_GROUP_SIZE = _SLOT.size * SLOTS_PER_GROUP
+_EMPTY_KEY = bytes(16)
+
+
+class RateLimiter:
+    def __init__(self, path, capacity, refill_rate, groups=1024):
+        self.path = path
+        self.capacity = float(capacity)
+        self.refill_rate = float(refill_rate)
+        self.groups = groups
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+
+    def _mapped(self):
+        # opened per process, a forked worker gets its own descriptor and locks
+        if self._pid != os.getpid():
+            size = self.groups * _GROUP_SIZE
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._fd, self._map, self._pid = fd, mmap.mmap(fd, size), os.getpid()
+        return self._map
+
+    def take(self, key, cost=1):
+        """Takes `cost` tokens from the bucket of `key`, returns 0 if it had them, else the seconds until it will"""
+        digest = hashlib.blake2b(str(key).encode('utf-8'), digest_size=16).digest()
+        start = int.from_bytes(digest[:4], 'little') % self.groups * _GROUP_SIZE
+        cost = min(float(cost), self.capacity)
+
+        with self._lock:
+            mapped = self._mapped()
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, _GROUP_SIZE, start)
+            try:
+                now = time.time()
+                slot, tokens = self._find(mapped, start, digest, now)
+                if tokens >= cost:
+                    tokens, retry_after = tokens - cost, 0
+                else:
+                    retry_after = (cost - tokens) / self.refill_rate
+                _SLOT.pack_into(mapped, slot, digest, tokens, now)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, _GROUP_SIZE, start)
+        return retry_after
+
+    def _find(self, mapped, start, digest, now):
+        """(offset, tokens now) of the bucket of `digest`, a full new one if it has none"""
+        free = None
+        for offset in range(start, start + _GROUP_SIZE, _SLOT.size):
+            key, tokens, updated_at = _SLOT.unpack_from(mapped, offset)
+            tokens = min(self.capacity, tokens + max(now - updated_at, 0.0) * self.refill_rate)
+            if key == digest:
+                return offset, tokens
+            if free is None and (key == _EMPTY_KEY or tokens >= self.capacity):
+                free = offset
+        # with every slot of the group in use the first one is shared, until one of them refills
+        return (start if free is None else free), self.capacity
+
+
+def init_app(app, path, capacity, refill_rate):
+    limiter = app.extensions['rate_limit'] = RateLimiter(path, capacity, refill_rate) if path else None
+    return limiter
+
+
+def get_limiter():
+    """RateLimiter of the current app, None when it does not limit"""
+    return current_app.extensions.get('rate_limit')
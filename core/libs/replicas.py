@@ -0,0 +1,116 @@
+import itertools
+import threading
+import time
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import event, orm, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql.dml import UpdateBase
+
+
+class ReplicaSet:
+    """
+    Engines of the read replicas, configured as SQLALCHEMY_BINDS named replica_<n>.
+    They are handed out round-robin. A replica is pinged at most every `check_interval` seconds,
+    and skipped until its next check after a failed ping or a connection error.
+    """
+
+    def __init__(self, db, app, check_interval=10):
+        self.db = db
+        self.app = app
+        self.check_interval = check_interval
+        self.names = []
+        self._counter = itertools.count()
+        self._health = {}
+        self._lock = threading.Lock()
+
+    def configure(self, urls):
+        binds = dict(self.app.config.get('SQLALCHEMY_BINDS') or {})
+        for name in self.names:
+            binds.pop(name, None)
+        self.names = ['replica_{0}'.format(index) for index in range(len(urls))]
+        binds.update(zip(self.names, urls))
+        self.app.config['SQLALCHEMY_BINDS'] = binds
+        with self._lock:
+            self._health.clear()
+
+    def engines(self):
+        return [self.db.get_engine(self.app, bind=name) for name in self.names]
+
+    def choose(self):
+        """Engine of the next healthy replica, None if there is none"""
+        for _ in range(len(self.names)):
+            name = self.names[next(self._counter) % len(self.names)]
+            engine = self.db.get_engine(self.app, bind=name)
+            if self._is_healthy(name, engine):
+                return engine
+        return None
+
+    def mark_down(self, name):
+        with self._lock:
+            self._health[name] = (False, time.monotonic())
+
+    def _is_healthy(self, name, engine):
+        with self._lock:
+            healthy, checked_at = self._health.get(name, (None, None))
+            if healthy is not None and time.monotonic() - checked_at < self.check_interval:
+                return healthy
+            # other threads keep the last result while this one pings
+            self._health[name] = (bool(healthy), time.monotonic())
+
+        if not event.contains(engine, 'handle_error', self._on_error):
+            event.listen(engine, 'handle_error', self._on_error)
+        try:
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+        except DBAPIError:
+            self.mark_down(name)
+            return False
+        with self._lock:
+            self._health[name] = (True, time.monotonic())
+        return True
+
+    def _on_error(self, exception_context):
+        if exception_context.is_disconnect or exception_context.connection is None:
+            for name in self.names:
+                if self.db.get_engine(self.app, bind=name) is exception_context.engine:
+                    self.mark_down(name)
+
+
+class RoutingSession(SignallingSession):
+    """
+    Sends reads to a replica while `info['read_replica']` is set. Flushes, DML and SELECT ... FOR UPDATE
+    go to the primary, and so does everything after them, so a request reads its own writes.
+    """
+
+    def __init__(self, db, **options):
+        super().__init__(db, **options)
+        self.replicas = self.app.extensions.get('replicas')
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.info.get('read_replica') and not self.info.get('primary_pinned'):
+            if self._flushing or isinstance(clause, UpdateBase) or getattr(clause, '_for_update_arg', None) is not None:
+                self.info['primary_pinned'] = True
+            else:
+                replica = self.info.get('replica')
+                if replica is None and self.replicas is not None:
+                    # one replica per session, so a request sees a single snapshot
+                    replica = self.info['replica'] = self.replicas.choose()
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def init_replicas(self, app, urls, check_interval=10):
+        """Gives `app` a ReplicaSet of its own, before `init_app`"""
+        replicas = app.extensions['replicas'] = ReplicaSet(self, app, check_interval=check_interval)
+        replicas.configure(urls)
+        return replicas
+
+    @property
+    def replicas(self):
+        """ReplicaSet of the current app"""
+        return self.get_app().extensions['replicas']
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
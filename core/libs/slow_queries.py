@@ -0,0 +1,142 @@
+"""
+Logs statements slower than a threshold, with the model method and route that issued them.
+A sample of them is EXPLAINed on a background thread so the plan can be checked for a missing index.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('fyle.slow_queries')
+
+_MODELS_DIR = os.path.join('core', 'models') + os.sep
+_WHITESPACE = re.compile(r'\s+')
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|%s)\s*,)+\s*(?:\?|%\(\w+\)s|%s)\s*\)')
+_EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+
+
+def normalize(statement):
+    """Statement on one line with placeholder lists collapsed, so IN lists of any size read the same"""
+    return _PLACEHOLDER_LIST.sub('(?, ...)', _WHITESPACE.sub(' ', statement).strip())
+
+
+def parameter_shapes(parameters, executemany):
+    """Types of the bind parameters, never their values"""
+    if executemany:
+        return {'rows': len(parameters), 'row': parameter_shapes(parameters[0], False) if parameters else None}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    return [type(value).__name__ for value in parameters or ()]
+
+
+def _caller(context):
+    """Model.method that issued the statement, tagged by the query or the first frame in core/models"""
+    caller = context.execution_options.get('caller') if context is not None else None
+    if caller is not None:
+        return caller
+    frame = sys._getframe(2)
+    while frame is not None:
+        if _MODELS_DIR in frame.f_code.co_filename:
+            owner = frame.f_locals.get('cls') or type(frame.f_locals.get('self', None))
+            return '{0}.{1}'.format(getattr(owner, '__name__', '?'), frame.f_code.co_name)
+        frame = frame.f_back
+    return None
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms, explain_sample_rate=0.1, path=None, max_bytes=10 * 1024 * 1024, backup_count=5):
+        self.threshold = threshold_ms / 1000
+        self.explain_sample_rate = explain_sample_rate
+        self.handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count) if path else None
+        if self.handler is not None:
+            # the logger is shared, each log's file only gets the entries of that log
+            self.handler.addFilter(lambda record: getattr(record, 'slow_query_log', None) is self)
+        self.engines = ()
+        self._explains = queue.Queue(maxsize=100)
+        self._thread = None
+
+    def install(self, *engines):
+        """Listens to the statements of `engines`, of every engine if none are given"""
+        self.engines = engines or (Engine,)
+        if self.handler is not None:
+            logger.addHandler(self.handler)
+        logger.setLevel(logging.INFO)
+        for engine in self.engines:
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        return self
+
+    def uninstall(self):
+        for engine in self.engines:
+            event.remove(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.remove(engine, 'after_cursor_execute', self._after_cursor_execute)
+        self.engines = ()
+        self.flush()
+        if self.handler is not None:
+            logger.removeHandler(self.handler)
+            self.handler.close()
+
+    def flush(self):
+        """Waits for the queued EXPLAINs to be written"""
+        self._explains.join()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info['slow_query_started_at'] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info.pop('slow_query_started_at', time.perf_counter())
+        if duration < self.threshold or conn.info.get('slow_query_explaining'):
+            return
+
+        entry = {
+            'sql': normalize(statement),
+            'parameters': parameter_shapes(parameters, executemany),
+            'duration_ms': round(duration * 1000, 3),
+            'caller': _caller(context),
+            'route': '{0} {1}'.format(request.method, request.url_rule.rule if request.url_rule else request.path)
+            if has_request_context() else None,
+        }
+        logger.warning('slow query %s', json.dumps(entry), extra={'slow_query_log': self})
+
+        if not executemany and statement.lstrip().upper().startswith(_EXPLAINABLE) \
+                and random.random() < self.explain_sample_rate:
+            try:
+                self._explains.put_nowait((conn.engine, statement, parameters, entry))
+            except queue.Full:
+                return
+            self._ensure_thread()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._explain_forever, name='slow-query-explain', daemon=True)
+            self._thread.start()
+
+    def _explain_forever(self):
+        while True:
+            engine, statement, parameters, entry = self._explains.get()
+            try:
+                self._explain(engine, statement, parameters, entry)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('could not explain %s', entry['sql'], extra={'slow_query_log': self})
+            finally:
+                self._explains.task_done()
+
+    def _explain(self, engine, statement, parameters, entry):
+        prefix = 'EXPLAIN QUERY PLAN ' if engine.dialect.name == 'sqlite' else 'EXPLAIN '
+        with engine.connect() as connection:
+            connection.info['slow_query_explaining'] = True
+            try:
+                rows = connection.exec_driver_sql(prefix + statement, parameters).fetchall()
+            finally:
+                connection.info.pop('slow_query_explaining', None)
+        plan = [' '.join(str(value) for value in row) for row in rows]
+        logger.info('query plan %s', json.dumps(dict(entry, plan=plan)), extra={'slow_query_log': self})
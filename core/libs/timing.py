@@ -0,0 +1,98 @@
+"""
+Per-request breakdown of where the time went: SQL, (de)serialization and the rest of the handler.
+
+Nothing is registered until `init_app` is called, so with the feature off the only cost is the
+`serialize_span()` calls returning a shared no-op context manager.
+"""
+import time
+from contextlib import nullcontext
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+ENVIRON_KEYS = ('fyle.db_queries', 'fyle.db_ms', 'fyle.serialize_ms', 'fyle.handler_ms')
+
+_NULL_SPAN = nullcontext()
+_installed = False
+
+
+class RequestTiming:
+    __slots__ = ('started_at', 'queries', 'db', 'serialize')
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+
+
+def _current():
+    return g.get('_request_timing') if has_app_context() else None
+
+
+class _SerializeSpan:
+    __slots__ = ('timing', 'started_at')
+
+    def __enter__(self):
+        self.timing = _current()
+        self.started_at = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self.timing is not None:
+            self.timing.serialize += time.perf_counter() - self.started_at
+
+
+def serialize_span():
+    """Counts the enclosed block as serialization time of the current request"""
+    return _SerializeSpan() if _installed else _NULL_SPAN
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['timing_started_at'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timing = _current()
+    if timing is not None:
+        timing.queries += 1
+        timing.db += time.perf_counter() - conn.info.pop('timing_started_at', time.perf_counter())
+
+
+def _start_request_timing():
+    g._request_timing = RequestTiming()
+
+
+def _finish_request_timing(response):
+    timing = g.pop('_request_timing', None)
+    if timing is None:
+        return response
+
+    total = time.perf_counter() - timing.started_at
+    handler = max(total - timing.db - timing.serialize, 0.0)
+    metrics = 'db;dur={0:.3f};desc="{1} queries", serialize;dur={2:.3f}, handler;dur={3:.3f}, total;dur={4:.3f}'.format(
+        timing.db * 1000, timing.queries, timing.serialize * 1000, handler * 1000, total * 1000)
+    # after the metrics a handler set itself
+    handler_metrics = response.headers.get('Server-Timing')
+    response.headers['Server-Timing'] = '{0}, {1}'.format(handler_metrics, metrics) if handler_metrics else metrics
+    # read by the access log, see access_log_format in gunicorn_config.py
+    request.environ.update(zip(ENVIRON_KEYS, (
+        str(timing.queries),
+        '{0:.3f}'.format(timing.db * 1000),
+        '{0:.3f}'.format(timing.serialize * 1000),
+        '{0:.3f}'.format(handler * 1000),
+    )))
+    return response
+
+
+def init_app(app):
+    global _installed
+    if 'timing' in app.extensions:
+        return
+    app.extensions['timing'] = True
+    app.before_request(_start_request_timing)
+    app.after_request(_finish_request_timing)
+    if not _installed:
+        # the engine listeners are shared by every app
+        _installed = True
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
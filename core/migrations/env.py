@@ -6,6 +6,7 @@ from logging.config import fileConfig
 from flask import current_app
 
 from alembic import context
+from sqlalchemy import inspect
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -81,8 +82,17 @@ def run_migrations_online():
             **current_app.extensions['migrate'].configure_args
         )
 
-        with context.begin_transaction():
-            context.run_migrations()
+        # the data migrations before d41b7c9e2a60 run assignment transitions, which record grading_stats
+        # before that revision creates the table. It counts every assignment written before it itself
+        from core.models.grading_stats import GradingStats
+        record = GradingStats.__dict__['record']
+        if not inspect(connection).has_table(GradingStats.__tablename__):
+            GradingStats.record = classmethod(lambda cls, changes: None)
+        try:
+            with context.begin_transaction():
+                context.run_migrations()
+        finally:
+            GradingStats.record = record
 
 
 if context.is_offline_mode():
@@ -0,0 +1,39 @@
+"""assignment indexes
+
+Revision ID: 9c1f3e5a7b2d
+Revises: 52a401750a76
+Create Date: 2026-10-17 10:02:41.318205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c1f3e5a7b2d'
+down_revision = '52a401750a76'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction, so the index builds are
+    # done in autocommit mode. On postgres this keeps `assignments` writable during deploy.
+    with op.get_context().autocommit_block():
+        op.create_index('ix_assignments_teacher_id_state', 'assignments', ['teacher_id', 'state'],
+                        postgresql_concurrently=True)
+        op.create_index('ix_assignments_student_id_updated_at', 'assignments', ['student_id', 'updated_at'],
+                        postgresql_concurrently=True)
+        op.create_index('ix_assignments_non_draft_updated_at', 'assignments', ['updated_at', 'id'],
+                        postgresql_concurrently=True,
+                        postgresql_where=sa.text("state != 'DRAFT'"))
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_assignments_non_draft_updated_at', table_name='assignments',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_assignments_student_id_updated_at', table_name='assignments',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_assignments_teacher_id_state', table_name='assignments',
+                      postgresql_concurrently=True)
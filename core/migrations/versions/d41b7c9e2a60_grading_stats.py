@@ -0,0 +1,70 @@
+"""grading stats
+
+Revision ID: d41b7c9e2a60
+Revises: 9c1f3e5a7b2d
+Create Date: 2026-10-17 14:26:09.552817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41b7c9e2a60'
+down_revision = '9c1f3e5a7b2d'
+branch_labels = None
+depends_on = None
+
+COUNT_COLUMNS = ['draft', 'submitted', 'graded', 'grade_a', 'grade_b', 'grade_c', 'grade_d']
+
+# the tables as they are at this revision, the models may have moved on since
+assignments = sa.table(
+    'assignments',
+    sa.column('student_id', sa.Integer), sa.column('teacher_id', sa.Integer),
+    sa.column('state', sa.String), sa.column('grade', sa.String),
+)
+grading_stats = sa.table(
+    'grading_stats',
+    sa.column('owner_type', sa.String), sa.column('owner_id', sa.Integer),
+    *[sa.column(column, sa.Integer) for column in COUNT_COLUMNS]
+)
+
+
+def _counts():
+    def count(condition):
+        return sa.func.sum(sa.case((condition, 1), else_=0))
+
+    graded = assignments.c.state == 'GRADED'
+    return [
+        count(assignments.c.state == 'DRAFT'),
+        count(assignments.c.state == 'SUBMITTED'),
+        count(graded),
+    ] + [count(graded & (assignments.c.grade == grade)) for grade in ('A', 'B', 'C', 'D')]
+
+
+def upgrade():
+    op.create_table('grading_stats',
+    sa.Column('owner_type', sa.String(length=16), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('draft', sa.Integer(), nullable=False),
+    sa.Column('submitted', sa.Integer(), nullable=False),
+    sa.Column('graded', sa.Integer(), nullable=False),
+    sa.Column('grade_a', sa.Integer(), nullable=False),
+    sa.Column('grade_b', sa.Integer(), nullable=False),
+    sa.Column('grade_c', sa.Integer(), nullable=False),
+    sa.Column('grade_d', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('owner_type', 'owner_id')
+    )
+
+    # INSERT .. SELECT .. GROUP BY of the counts of the assignments already there
+    by_student = sa.select(sa.literal('STUDENT'), assignments.c.student_id, *_counts()) \
+        .group_by(assignments.c.student_id)
+    by_teacher = sa.select(sa.literal('TEACHER'), assignments.c.teacher_id, *_counts()) \
+        .where(assignments.c.teacher_id.isnot(None)).group_by(assignments.c.teacher_id)
+    op.execute(grading_stats.insert().from_select(
+        ['owner_type', 'owner_id'] + COUNT_COLUMNS, sa.union_all(by_student, by_teacher)
+    ))
+
+
+def downgrade():
+    op.drop_table('grading_stats')
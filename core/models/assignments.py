@@ -1,9 +1,12 @@
 import enum
 from core import db
 from core.apis.decorators import AuthPrincipal
-from core.libs import helpers, assertions
+from core.libs import helpers, assertions, pagination
+from core.libs.exceptions import FyleError
+from core.models.grading_stats import GradingStats
 from core.models.teachers import Teacher
 from core.models.students import Student
+from sqlalchemy import case, cast, column, insert, select, update
 from sqlalchemy.types import Enum as BaseEnum
 
 
@@ -31,6 +34,13 @@ class Assignment(db.Model):
     created_at = db.Column(db.TIMESTAMP(timezone=True), default=helpers.get_utc_now, nullable=False)
     updated_at = db.Column(db.TIMESTAMP(timezone=True), default=helpers.get_utc_now, nullable=False, onupdate=helpers.get_utc_now)
 
+    __table_args__ = (
+        db.Index('ix_assignments_teacher_id_state', 'teacher_id', 'state'),
+        db.Index('ix_assignments_student_id_updated_at', 'student_id', 'updated_at'),
+        db.Index('ix_assignments_non_draft_updated_at', 'updated_at', 'id',
+                 postgresql_where=db.text("state != 'DRAFT'")),
+    )
+
     def __repr__(self):
         return '<Assignment %r>' % self.id
 
@@ -53,62 +63,335 @@ class Assignment(db.Model):
                                     'only assignment in draft state can be edited')
 
             assignment.content = assignment_new.content
+            db.session.flush()
         else:
             assignment = assignment_new
             db.session.add(assignment_new)
+            db.session.flush()
+            GradingStats.record([(assignment.student_id, None, (None, AssignmentStateEnum.DRAFT, None))])
 
-        db.session.flush()
         return assignment
 
     @classmethod
-    def submit(cls, _id, teacher_id, auth_principal: AuthPrincipal):
-        assignment = Assignment.get_by_id(_id)
+    def _insert_drafts(cls, student_id, contents):
+        """Inserts one draft per content with a single multi-row INSERT and returns them"""
+        now = helpers.get_utc_now()
+        rows = [
+            {'student_id': student_id, 'content': content, 'state': AssignmentStateEnum.DRAFT,
+             'created_at': now, 'updated_at': now}
+            for content in contents
+        ]
+        statement = insert(cls).values(rows)
+        dialect = db.engine.dialect
+
+        if dialect.full_returning:
+            statement = statement.returning(*cls.__table__.columns)
+            orm_statement = select(cls).from_statement(statement).execution_options(populate_existing=True)
+            return db.session.execute(orm_statement).scalars().all()
+
+        if dialect.name == 'sqlite':
+            # rowids handed out by a single INSERT are consecutive, sqlite holds the write lock throughout
+            last_id = db.session.execute(statement).lastrowid
+            return cls.filter(cls.id.between(last_id - len(rows) + 1, last_id)).order_by(cls.id).all()
+
+        assignments = [cls(**row) for row in rows]
+        db.session.add_all(assignments)
+        db.session.flush()
+        return assignments
+
+    @classmethod
+    def bulk_upsert(cls, assignments_new, auth_principal: AuthPrincipal):
+        """
+        Edits the drafts that have an id with one UPDATE and creates the rest with one INSERT.
+        Returns the upserted assignments and a list of failures.
+        """
+        assertions.assert_valid(all(assignment.content is not None for assignment in assignments_new),
+                                'assignment content cannot be null')
+        edits = [assignment for assignment in assignments_new if assignment.id is not None]
+        contents = [assignment.content for assignment in assignments_new if assignment.id is None]
+
+        edited, failures = cls._bulk_transition(
+            [assignment.id for assignment in edits],
+            [cls.student_id == auth_principal.student_id, cls.state == AssignmentStateEnum.DRAFT],
+            {'content': case({assignment.id: assignment.content for assignment in edits}, value=cls.id)},
+            lambda assignment: cls._assert_editable(assignment, auth_principal)
+        )
+        created = cls._insert_drafts(auth_principal.student_id, contents) if contents else []
+        GradingStats.record([
+            (assignment.student_id, None, (None, AssignmentStateEnum.DRAFT, None)) for assignment in created
+        ])
+
+        return edited + created, failures
+
+    @classmethod
+    def _transition(cls, _id, criterion, values):
+        """
+        Applies `values` to the assignment with id `_id` in a single UPDATE, guarded by `criterion`.
+        Returns the updated assignment, or None if no row matched the guard.
+        """
+        statement = update(cls).where(cls.id == _id, *criterion).values(**values)
+
+        if db.engine.dialect.full_returning:
+            statement = statement.returning(*cls.__table__.columns)
+            orm_statement = select(cls).from_statement(statement).execution_options(populate_existing=True)
+            return db.session.execute(orm_statement).scalars().first()
+
+        # no UPDATE .. RETURNING here (sqlite), read the row back only if the update went through
+        result = db.session.execute(statement, execution_options={'synchronize_session': False})
+        if result.rowcount == 0:
+            return None
+        return cls.filter(cls.id == _id).populate_existing().first()
+
+    @classmethod
+    def _bulk_transition(cls, ids, criterion, values, assert_allowed, previous=()):
+        """
+        Applies `values` to every assignment in `ids` that matches `criterion`, in a single UPDATE.
+        Rows that were not updated are checked with `assert_allowed` to report why.
+        Returns the updated assignments and a list of failures, and when `previous` columns are given,
+        a dict of their values before the UPDATE by id of the updated assignments.
+        """
+        # a repeated id would be reported as updated twice, and counted twice in the grading stats
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return ([], [], {}) if previous else ([], [])
+
+        dialect = db.engine.dialect
+        statement = update(cls).where(cls.id.in_(ids), *criterion).values(**values)
+        previous_values = {}
+
+        if dialect.full_returning:
+            returning = list(cls.__table__.columns)
+            result_columns = []
+            if previous:
+                # the old values come from the rows the UPDATE joins, locked by the same statement
+                locked = select(cls.id, *previous).where(cls.id.in_(ids)).with_for_update().subquery('previous')
+                statement = statement.where(cls.id == locked.c.id)
+                returning += [locked.c[col.key].label('previous_' + col.key) for col in previous]
+                result_columns = [column('previous_' + col.key, col.type) for col in previous]
+            orm_statement = select(cls, *result_columns).from_statement(statement.returning(*returning)) \
+                .execution_options(populate_existing=True)
+            updated = {}
+            for assignment, *old in db.session.execute(orm_statement):
+                updated[assignment.id] = assignment
+                previous_values[assignment.id] = tuple(old)
+            not_updated = [_id for _id in ids if _id not in updated]
+            existing = {assignment.id: assignment for assignment in cls.filter(cls.id.in_(not_updated))} \
+                if not_updated else {}
+        elif dialect.name == 'sqlite':
+            # stamp the rows with a marker timestamp and read the batch back. sqlite holds the write lock
+            # until commit, so nothing else can have written that same marker in between.
+            if previous:
+                cls._begin_write()
+                previous_values = cls._previous_values(ids, previous)
+            marker = helpers.get_utc_now()
+            db.session.execute(statement.values(updated_at=marker),
+                               execution_options={'synchronize_session': False})
+            existing = {assignment.id: assignment for assignment in cls.filter(cls.id.in_(ids)).populate_existing()}
+            updated = {_id: assignment for _id, assignment in existing.items() if assignment.updated_at == marker}
+        else:
+            # a marker would not survive the truncation of DATETIME columns (mysql), lock the rows that
+            # pass the guard instead and update exactly those
+            matching = db.session.execute(
+                select(cls.id).where(cls.id.in_(ids), *criterion).with_for_update()
+            ).scalars().all()
+            if previous:
+                previous_values = cls._previous_values(matching, previous)
+            if matching:
+                db.session.execute(update(cls).where(cls.id.in_(matching)).values(**values),
+                                   execution_options={'synchronize_session': False})
+            existing = {assignment.id: assignment for assignment in cls.filter(cls.id.in_(ids)).populate_existing()}
+            updated = {_id: existing[_id] for _id in matching}
+
+        failures = []
+        for _id in ids:
+            if _id in updated:
+                continue
+            try:
+                assert_allowed(existing.get(_id))
+                cls._assert_concurrent_change()
+            except FyleError as err:
+                failures.append({'id': _id, 'error': err.__class__.__name__, 'message': err.message,
+                                 'status_code': err.status_code})
+
+        updated = [updated[_id] for _id in ids if _id in updated]
+        if previous:
+            return updated, failures, {assignment.id: previous_values[assignment.id] for assignment in updated}
+        return updated, failures
+
+    @staticmethod
+    def _begin_write():
+        """Starts the transaction with sqlite's write lock, pysqlite only begins one at the first write itself"""
+        connection = db.session.connection()
+        if not connection.connection.in_transaction:
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+    @classmethod
+    def _previous_values(cls, ids, columns):
+        rows = db.session.execute(select(cls.id, *columns).where(cls.id.in_(ids)))
+        return {_id: tuple(values) for _id, *values in rows}
+
+    @staticmethod
+    def _assert_editable(assignment, auth_principal: AuthPrincipal):
+        assertions.assert_found(assignment, 'No assignment with this id was found')
+        assertions.assert_valid(assignment.student_id == auth_principal.student_id, 'This assignment belongs to some other student')
+        assertions.assert_valid(assignment.state == AssignmentStateEnum.DRAFT,
+                                'only assignment in draft state can be edited')
+
+    @staticmethod
+    def _assert_submittable(assignment, auth_principal: AuthPrincipal):
         assertions.assert_found(assignment, 'No assignment with this id was found')
         assertions.assert_valid(assignment.student_id == auth_principal.student_id, 'This assignment belongs to some other student')
         assertions.assert_valid(assignment.content is not None, 'assignment with empty content cannot be submitted')
         assertions.assert_valid(assignment.state == AssignmentStateEnum.DRAFT, 'only a draft assignment can be submitted')
 
-        assignment.teacher_id = teacher_id
-        assignment.state = AssignmentStateEnum.SUBMITTED
-        db.session.flush()
+    @staticmethod
+    def _assert_gradable_by_teacher(assignment, auth_principal: AuthPrincipal):
+        assertions.assert_found(assignment, 'No assignment with this id was found')
+        assertions.assert_valid(assignment.teacher_id == auth_principal.teacher_id, 'This assignment belongs to some other teacher')
+        assertions.assert_valid(assignment.state == AssignmentStateEnum.SUBMITTED, 'only a submitted assignment can be graded')
+
+    @staticmethod
+    def _assert_gradable_by_principal(assignment):
+        assertions.assert_found(assignment, 'No assignment with this id was found')
+        assertions.assert_valid(assignment.state != AssignmentStateEnum.DRAFT,
+                                'Draft assignments cannot be graded by principal')
+
+    @classmethod
+    def _assert_concurrent_change(cls):
+        # the guard did not match but the row passes the checks now, someone else changed it in between
+        assertions.assert_valid(False, 'assignment was modified concurrently, please retry')
+
+    @classmethod
+    def submit(cls, _id, teacher_id, auth_principal: AuthPrincipal):
+        assignment = cls._transition(
+            _id,
+            [
+                cls.student_id == auth_principal.student_id,
+                cls.content.isnot(None),
+                cls.state == AssignmentStateEnum.DRAFT
+            ],
+            {'teacher_id': teacher_id, 'state': AssignmentStateEnum.SUBMITTED}
+        )
+        if assignment is None:
+            cls._assert_submittable(cls.get_by_id(_id), auth_principal)
+            cls._assert_concurrent_change()
 
+        GradingStats.record([cls._submit_change(assignment)])
         return assignment
 
+    @staticmethod
+    def _submit_change(assignment):
+        return (assignment.student_id, (None, AssignmentStateEnum.DRAFT, None),
+                (assignment.teacher_id, AssignmentStateEnum.SUBMITTED, None))
+
+    @staticmethod
+    def _grade_change(assignment, previous_state, previous_grade):
+        return (assignment.student_id, (assignment.teacher_id, previous_state, previous_grade),
+                (assignment.teacher_id, AssignmentStateEnum.GRADED, assignment.grade))
 
     @classmethod
-    def mark_grade(cls, _id, grade, auth_principal: AuthPrincipal):
-        assignment = Assignment.get_by_id(_id)
-        assertions.assert_found(assignment, 'No assignment with this id was found')
-        assertions.assert_valid(assignment.teacher_id == auth_principal.teacher_id, 'This assignment belongs to some other teacher')
-        assertions.assert_valid(assignment.state == AssignmentStateEnum.SUBMITTED, 'only a submitted assignment can be graded')
+    def bulk_submit(cls, submissions, auth_principal: AuthPrincipal):
+        """Submits a batch of (id, teacher_id) pairs with one UPDATE, under the same rules as `submit`"""
+        teacher_ids = {teacher_id for _, teacher_id in submissions}
+        known_teacher_ids = {_id for _id, in db.session.query(Teacher.id).filter(Teacher.id.in_(teacher_ids))} \
+            if teacher_ids else set()
 
-        assignment.grade = grade
-        assignment.state = AssignmentStateEnum.GRADED
-        db.session.flush()
+        failures = [
+            {'id': _id, 'error': 'FyleError', 'message': 'No teacher with this id was found', 'status_code': 404}
+            for _id, teacher_id in submissions if teacher_id not in known_teacher_ids
+        ]
+        submissions = [(_id, teacher_id) for _id, teacher_id in submissions if teacher_id in known_teacher_ids]
 
+        submitted, transition_failures = cls._bulk_transition(
+            [_id for _id, _ in submissions],
+            [
+                cls.student_id == auth_principal.student_id,
+                cls.content.isnot(None),
+                cls.state == AssignmentStateEnum.DRAFT
+            ],
+            {'teacher_id': case(dict(submissions), value=cls.id), 'state': AssignmentStateEnum.SUBMITTED},
+            lambda assignment: cls._assert_submittable(assignment, auth_principal)
+        )
+        GradingStats.record([cls._submit_change(assignment) for assignment in submitted])
+        return submitted, failures + transition_failures
+
+    @classmethod
+    def mark_grade(cls, _id, grade, auth_principal: AuthPrincipal):
+        assignment = cls._transition(
+            _id,
+            [cls.teacher_id == auth_principal.teacher_id, cls.state == AssignmentStateEnum.SUBMITTED],
+            {'grade': grade, 'state': AssignmentStateEnum.GRADED}
+        )
+        if assignment is None:
+            cls._assert_gradable_by_teacher(cls.get_by_id(_id), auth_principal)
+            cls._assert_concurrent_change()
+
+        GradingStats.record([cls._grade_change(assignment, AssignmentStateEnum.SUBMITTED, None)])
         return assignment
 
     @classmethod
-    def get_assignments_by_student(cls, student_id):
-        return cls.filter(cls.student_id == student_id).all()
+    def _grade_case(cls, grades):
+        grade_by_id = {_id: grade.value for _id, grade in grades}
+        return cast(case(grade_by_id, value=cls.id), cls.grade.type)
 
     @classmethod
-    def get_assignments_by_teacher(cls, teacher_id):
-        return cls.filter(cls.teacher_id == teacher_id).all()
-    
+    def bulk_mark_grade(cls, grades, auth_principal: AuthPrincipal):
+        """Grades a batch of (id, grade) pairs with one UPDATE, under the same rules as `mark_grade`"""
+        graded, failures = cls._bulk_transition(
+            [_id for _id, _ in grades],
+            [cls.teacher_id == auth_principal.teacher_id, cls.state == AssignmentStateEnum.SUBMITTED],
+            {'grade': cls._grade_case(grades), 'state': AssignmentStateEnum.GRADED},
+            lambda assignment: cls._assert_gradable_by_teacher(assignment, auth_principal)
+        )
+        GradingStats.record([
+            cls._grade_change(assignment, AssignmentStateEnum.SUBMITTED, None) for assignment in graded
+        ])
+        return graded, failures
+
+    @classmethod
+    def get_assignments_by_student(cls, student_id, page_request: pagination.PageRequest):
+        return pagination.KeysetPage(cls.filter(cls.student_id == student_id), cls, page_request,
+                                     'Assignment.get_assignments_by_student')
+
     @classmethod
-    def get_submitted_and_graded_assignments(cls):
-        return cls.filter(cls.state.in_([AssignmentStateEnum.SUBMITTED, AssignmentStateEnum.GRADED])).all()
+    def get_assignments_by_teacher(cls, teacher_id, page_request: pagination.PageRequest):
+        return pagination.KeysetPage(cls.filter(cls.teacher_id == teacher_id), cls, page_request,
+                                     'Assignment.get_assignments_by_teacher')
+
+    @classmethod
+    def get_submitted_and_graded_assignments(cls, page_request: pagination.PageRequest):
+        return pagination.KeysetPage(
+            cls.filter(cls.state != AssignmentStateEnum.DRAFT), cls, page_request,
+            'Assignment.get_submitted_and_graded_assignments'
+        )
 
     @classmethod
     def principal_mark_grade(cls, _id, grade, auth_principal: AuthPrincipal):
-        assignment = Assignment.get_by_id(_id)
-        assertions.assert_found(assignment, 'No assignment with this id was found')
-        assertions.assert_valid(assignment.state != AssignmentStateEnum.DRAFT, 
-                                'Draft assignments cannot be graded by principal')
-        
-        assignment.grade = grade
-        assignment.state = AssignmentStateEnum.GRADED
-        db.session.flush()
-        
+        # a principal can also re-grade, so the previous state and grade are needed for the stats
+        graded, _, previous = cls._bulk_transition(
+            [_id],
+            [cls.state != AssignmentStateEnum.DRAFT],
+            {'grade': grade, 'state': AssignmentStateEnum.GRADED},
+            cls._assert_gradable_by_principal,
+            previous=(cls.state, cls.grade)
+        )
+        if not graded:
+            cls._assert_gradable_by_principal(cls.get_by_id(_id))
+            cls._assert_concurrent_change()
+
+        assignment = graded[0]
+        GradingStats.record([cls._grade_change(assignment, *previous[_id])])
         return assignment
+
+    @classmethod
+    def bulk_principal_mark_grade(cls, grades, auth_principal: AuthPrincipal):
+        """Grades or re-grades a batch of (id, grade) pairs with one UPDATE, under the rules of `principal_mark_grade`"""
+        graded, failures, previous = cls._bulk_transition(
+            [_id for _id, _ in grades],
+            [cls.state != AssignmentStateEnum.DRAFT],
+            {'grade': cls._grade_case(grades), 'state': AssignmentStateEnum.GRADED},
+            cls._assert_gradable_by_principal,
+            previous=(cls.state, cls.grade)
+        )
+        GradingStats.record([cls._grade_change(assignment, *previous[assignment.id]) for assignment in graded])
+        return graded, failures
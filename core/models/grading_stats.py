@@ -0,0 +1,202 @@
+from collections import Counter, defaultdict
+from core import config, db
+from core.libs.cache import TTLCache
+from sqlalchemy import case, delete, event, func, insert, literal, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+STATE_COLUMNS = ['draft', 'submitted', 'graded']
+GRADE_COLUMNS = ['grade_a', 'grade_b', 'grade_c', 'grade_d']
+COUNT_COLUMNS = STATE_COLUMNS + GRADE_COLUMNS
+
+_DIALECT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+class GradingStats(db.Model):
+    """
+    Per-teacher and per-student assignment counts by state and grade, kept up to date by the
+    assignment state transitions in the same transaction. `rebuild` recomputes it from `assignments`.
+    """
+    __tablename__ = 'grading_stats'
+    owner_type = db.Column(db.String(16), primary_key=True)
+    owner_id = db.Column(db.Integer, primary_key=True)
+    draft = db.Column(db.Integer, default=0, nullable=False)
+    submitted = db.Column(db.Integer, default=0, nullable=False)
+    graded = db.Column(db.Integer, default=0, nullable=False)
+    grade_a = db.Column(db.Integer, default=0, nullable=False)
+    grade_b = db.Column(db.Integer, default=0, nullable=False)
+    grade_c = db.Column(db.Integer, default=0, nullable=False)
+    grade_d = db.Column(db.Integer, default=0, nullable=False)
+
+    TEACHER = 'TEACHER'
+    STUDENT = 'STUDENT'
+
+    # the serialized summary, dropped whenever any count changes
+    cache = TTLCache(
+        maxsize=1,
+        ttl=config.GRADING_STATS_CACHE_TTL,
+        broadcast_path=config.cache_broadcast_path('grading_stats')
+    )
+
+    def __repr__(self):
+        return '<GradingStats %s %r>' % (self.owner_type, self.owner_id)
+
+    @staticmethod
+    def _columns_for(state, grade):
+        columns = [state.value.lower()]
+        if columns[0] == 'graded' and grade is not None:
+            columns.append('grade_' + grade.value.lower())
+        return columns
+
+    @classmethod
+    def record(cls, changes):
+        """
+        Applies the count deltas of a batch of assignment changes with a single upsert.
+        `changes` are (student_id, before, after) where before and after are (teacher_id, state, grade),
+        and before is None for a newly created assignment.
+        """
+        deltas = defaultdict(Counter)
+        for student_id, before, after in changes:
+            for sign, side in ((-1, before), (1, after)):
+                if side is None:
+                    continue
+                teacher_id, state, grade = side
+                for column in cls._columns_for(state, grade):
+                    deltas[(cls.STUDENT, student_id)][column] += sign
+                    if teacher_id is not None:
+                        deltas[(cls.TEACHER, teacher_id)][column] += sign
+
+        rows = [
+            {'owner_type': owner_type, 'owner_id': owner_id, **{column: delta[column] for column in COUNT_COLUMNS}}
+            for (owner_type, owner_id), delta in deltas.items() if any(delta.values())
+        ]
+        if rows:
+            cls._add_counts(rows)
+            cls._invalidate_cache(db.session)
+
+    @classmethod
+    def _add_counts(cls, rows):
+        table = cls.__table__
+        dialect_insert = _DIALECT_INSERTS.get(db.engine.dialect.name)
+
+        if dialect_insert is not None:
+            statement = dialect_insert(table).values(rows)
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.owner_type, table.c.owner_id],
+                set_={column: table.c[column] + statement.excluded[column] for column in COUNT_COLUMNS}
+            )
+            db.session.execute(statement)
+            return
+
+        for row in rows:
+            result = db.session.execute(
+                table.update()
+                .where(table.c.owner_type == row['owner_type'], table.c.owner_id == row['owner_id'])
+                .values({column: table.c[column] + row[column] for column in COUNT_COLUMNS})
+            )
+            if result.rowcount == 0:
+                db.session.execute(table.insert().values(row))
+
+    @classmethod
+    def _aggregate_query(cls):
+        from core.models.assignments import Assignment, AssignmentStateEnum, GradeEnum
+
+        counts = [
+            func.sum(case((Assignment.state == state, 1), else_=0)).label(state.value.lower())
+            for state in AssignmentStateEnum
+        ] + [
+            func.sum(case(((Assignment.state == AssignmentStateEnum.GRADED) & (Assignment.grade == grade), 1),
+                          else_=0)).label('grade_' + grade.value.lower())
+            for grade in GradeEnum
+        ]
+        by_student = select(literal(cls.STUDENT).label('owner_type'), Assignment.student_id.label('owner_id'),
+                            *counts).group_by(Assignment.student_id)
+        by_teacher = select(literal(cls.TEACHER).label('owner_type'), Assignment.teacher_id.label('owner_id'),
+                            *counts).where(Assignment.teacher_id.isnot(None)).group_by(Assignment.teacher_id)
+        return union_all(by_student, by_teacher)
+
+    @classmethod
+    def compute(cls, executor=None):
+        """Counts as they should be, recomputed from `assignments` with a grouped scan"""
+        executor = executor or db.session
+        return {
+            (row.owner_type, row.owner_id): {column: int(row._mapping[column]) for column in COUNT_COLUMNS}
+            for row in executor.execute(cls._aggregate_query())
+        }
+
+    @classmethod
+    def snapshot(cls):
+        return {
+            (stats.owner_type, stats.owner_id): {column: getattr(stats, column) for column in COUNT_COLUMNS}
+            for stats in db.session.query(cls)
+        }
+
+    @classmethod
+    def rebuild(cls, executor=None):
+        """Replaces the whole table with counts recomputed from `assignments`"""
+        executor = executor or db.session
+        rows = [
+            {'owner_type': owner_type, 'owner_id': owner_id, **counts}
+            for (owner_type, owner_id), counts in cls.compute(executor).items()
+        ]
+        executor.execute(delete(cls.__table__))
+        if rows:
+            executor.execute(insert(cls.__table__), rows)
+        cls._invalidate_cache(executor)
+
+    @classmethod
+    def _invalidate_cache(cls, executor):
+        cls.cache.clear()
+        if executor is db.session:
+            # clear again on commit, a reader may have cached the old counts while this transaction was open
+            executor.info['grading_stats_changed'] = True
+
+    @classmethod
+    def get_graded_counts_by_student(cls):
+        return db.session.query(cls.owner_id, cls.graded).filter(
+            cls.owner_type == cls.STUDENT, cls.graded > 0
+        ).order_by(cls.owner_id).all()
+
+    @classmethod
+    def get_grade_a_count_for_teacher_with_max_grading(cls):
+        stats = db.session.query(cls).filter(
+            cls.owner_type == cls.TEACHER, cls.graded > 0
+        ).order_by(cls.graded.desc(), cls.owner_id).first()
+        return stats.grade_a if stats is not None else 0
+
+    @staticmethod
+    def _counts_dump(counts):
+        return {
+            'states': {column.upper(): counts[column] for column in STATE_COLUMNS},
+            'grades': {column[len('grade_'):].upper(): counts[column] for column in GRADE_COLUMNS}
+        }
+
+    @classmethod
+    def get_summary(cls):
+        """Counts by state and grade per teacher and per student, with the overall grade histogram"""
+        stats_rows = db.session.query(cls).order_by(cls.owner_type, cls.owner_id).all()
+        histogram = db.session.query(
+            *[func.coalesce(func.sum(getattr(cls, column)), 0).label(column) for column in GRADE_COLUMNS]
+        ).filter(cls.owner_type == cls.STUDENT).one()
+
+        summary = {'teachers': [], 'students': []}
+        for stats in stats_rows:
+            counts = {column: getattr(stats, column) for column in COUNT_COLUMNS}
+            if not any(counts.values()):
+                continue
+            if stats.owner_type == cls.TEACHER:
+                summary['teachers'].append({'teacher_id': stats.owner_id, **cls._counts_dump(counts)})
+            else:
+                summary['students'].append({'student_id': stats.owner_id, **cls._counts_dump(counts)})
+
+        summary['grade_histogram'] = {
+            column[len('grade_'):].upper(): int(histogram._mapping[column]) for column in GRADE_COLUMNS
+        }
+        summary['grade_a_count_for_teacher_with_max_grading'] = cls.get_grade_a_count_for_teacher_with_max_grading()
+        return summary
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_cache_on_commit(session):
+    if session.info.pop('grading_stats_changed', False):
+        GradingStats.cache.clear()
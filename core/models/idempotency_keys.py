@@ -0,0 +1,86 @@
+import hashlib
+from datetime import timedelta
+from core import db
+from core.libs import helpers
+from sqlalchemy import exc, select
+
+
+class IdempotencyKey(db.Model):
+    """
+    The first response to a POST sent with an Idempotency-Key header, replayed to its retries until `expires_at`.
+    A row without a `status_code` is a request still running, it holds the key until `expires_at` too.
+    Rows are written on connections of their own, so they are seen by every worker before the handler's
+    transaction ends, and are kept if it rolls back. See `decorators.idempotent`.
+    """
+    __tablename__ = 'idempotency_keys'
+    user_id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.String(32), nullable=False)
+    status_code = db.Column(db.Integer, nullable=True)
+    body = db.Column(db.LargeBinary, nullable=True)
+    created_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False)
+    expires_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False, index=True)
+
+    def __repr__(self):
+        return '<IdempotencyKey %r %r>' % (self.user_id, self.key)
+
+    @staticmethod
+    def fingerprint_of(method, path, body):
+        """Digest of what the key was first sent with, a retry has to match it"""
+        digest = hashlib.blake2b(digest_size=16)
+        for part in (method.encode('utf-8'), path.encode('utf-8'), body):
+            digest.update(part)
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    @classmethod
+    def _where_key(cls, user_id, key):
+        table = cls.__table__
+        return (table.c.user_id == user_id) & (table.c.key == key)
+
+    @classmethod
+    def claim(cls, user_id, key, fingerprint, lock_timeout):
+        """
+        Takes the key for a request about to run, for at most `lock_timeout` seconds.
+        Returns None if it got the key, else the row holding it.
+        """
+        table = cls.__table__
+        now = helpers.get_utc_now()
+        with db.engine.begin() as connection:
+            # a stored response past its ttl, or a request that died before finishing, frees the key
+            connection.execute(table.delete().where(cls._where_key(user_id, key), table.c.expires_at <= now))
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(table.insert().values(
+                    user_id=user_id, key=key, fingerprint=fingerprint,
+                    created_at=now, expires_at=now + timedelta(seconds=lock_timeout)
+                ))
+            return None
+        except exc.IntegrityError:
+            return cls.get(user_id, key)
+
+    @classmethod
+    def get(cls, user_id, key):
+        with db.engine.connect() as connection:
+            return connection.execute(select(cls.__table__).where(cls._where_key(user_id, key))).first()
+
+    @classmethod
+    def complete(cls, user_id, key, status_code, body, ttl):
+        """Stores the response of the request holding the key, to be replayed for `ttl` seconds"""
+        with db.engine.begin() as connection:
+            connection.execute(cls.__table__.update().where(cls._where_key(user_id, key)).values(
+                status_code=status_code, body=body, expires_at=helpers.get_utc_now() + timedelta(seconds=ttl)
+            ))
+
+    @classmethod
+    def release(cls, user_id, key):
+        """Frees the key of a request that failed, so that a retry runs it again"""
+        table = cls.__table__
+        with db.engine.begin() as connection:
+            connection.execute(table.delete().where(cls._where_key(user_id, key), table.c.status_code.is_(None)))
+
+    @classmethod
+    def purge_expired(cls):
+        table = cls.__table__
+        with db.engine.begin() as connection:
+            return connection.execute(table.delete().where(table.c.expires_at <= helpers.get_utc_now())).rowcount
@@ -1,5 +1,8 @@
-from core import db
+from core import config, db
 from core.libs import helpers
+from core.libs.cache import TTLCache
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
 
 
 class Teacher(db.Model):
@@ -9,9 +12,31 @@ class Teacher(db.Model):
     created_at = db.Column(db.TIMESTAMP(timezone=True), default=helpers.get_utc_now, nullable=False)
     updated_at = db.Column(db.TIMESTAMP(timezone=True), default=helpers.get_utc_now, nullable=False, onupdate=helpers.get_utc_now)
 
+    # serialized views of the roster, which changes far less often than it is read
+    cache = TTLCache(
+        maxsize=config.TEACHERS_CACHE_MAXSIZE,
+        ttl=config.TEACHERS_CACHE_TTL,
+        broadcast_path=config.cache_broadcast_path('teachers')
+    )
+
     def __repr__(self):
         return '<Teacher %r>' % self.id
     
     @classmethod
     def get_all(cls):
         return cls.query.all()
+
+
+@event.listens_for(Teacher, 'after_insert')
+@event.listens_for(Teacher, 'after_update')
+@event.listens_for(Teacher, 'after_delete')
+def _invalidate_cache(mapper, connection, target):
+    Teacher.cache.clear()
+    # clear again on commit, a reader may have cached the old roster while this transaction was open
+    object_session(target).info['teachers_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_cache_on_commit(session):
+    if session.info.pop('teachers_changed', False):
+        Teacher.cache.clear()
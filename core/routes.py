@@ -0,0 +1,101 @@
+"""
+Everything create_app adds to an app: the api blueprints, the request hooks, the service routes,
+the cli commands and the error handler.
+"""
+import click
+from flask import current_app, jsonify, request
+from marshmallow.exceptions import ValidationError
+from core import config, db
+from core.apis.assignments import student_assignments_resources, teacher_assignments_resources
+from core.apis.assignments.principal import principal_assignments_resources
+from core.apis.responses import APIResponse
+from core.libs import compression, helpers, metrics, rate_limit, timing
+from core.libs.db_pool import pool_stats
+from core.libs.exceptions import FyleError, RateLimitExceeded
+from core.libs.slow_queries import SlowQueryLog
+from core.models.grading_stats import GradingStats
+from core.models.idempotency_keys import IdempotencyKey
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import HTTPException
+
+API_BLUEPRINT_NAMES = (
+    principal_assignments_resources.name, student_assignments_resources.name, teacher_assignments_resources.name
+)
+
+
+def init_app(app):
+    app.register_blueprint(principal_assignments_resources, url_prefix='/principal')
+    app.register_blueprint(student_assignments_resources, url_prefix='/student')
+    app.register_blueprint(teacher_assignments_resources, url_prefix='/teacher')
+
+    metrics.init_app(app)
+    if config.SERVER_TIMING_ENABLED:
+        timing.init_app(app)
+    if config.COMPRESSION_ENABLED:
+        # after timing, so its after_request hook runs first and the compression counts as serialization
+        compression.init_app(app, min_size=config.COMPRESSION_MIN_SIZE, levels=config.COMPRESSION_LEVELS)
+    rate_limit.init_app(app, config.RATE_LIMIT_FILE, config.RATE_LIMIT_CAPACITY, config.RATE_LIMIT_REFILL_RATE)
+    if config.SLOW_QUERY_THRESHOLD_MS is not None:
+        # on the engines of this app, every other app built in the process would log its statements again
+        engines = [db.get_engine(app)] + app.extensions['replicas'].engines()
+        app.extensions['slow_query_log'] = SlowQueryLog(
+            config.SLOW_QUERY_THRESHOLD_MS,
+            explain_sample_rate=config.SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+            path=config.SLOW_QUERY_LOG_FILE
+        ).install(*engines)
+
+    app.before_request(route_reads_to_replica)
+    app.add_url_rule('/', view_func=ready)
+    app.add_url_rule('/metrics', view_func=export_metrics)
+    app.cli.command('rebuild-grading-stats')(rebuild_grading_stats)
+    app.cli.command('purge-idempotency-keys')(purge_idempotency_keys)
+    app.register_error_handler(Exception, handle_error)
+
+
+def route_reads_to_replica():
+    # a no-op without DATABASE_REPLICA_URLS, the session falls back to the primary
+    if request.method in ('GET', 'HEAD') and request.blueprint in API_BLUEPRINT_NAMES:
+        db.session.info['read_replica'] = True
+
+
+def ready():
+    response = jsonify({
+        'status': 'ready',
+        'time': helpers.get_utc_now(),
+        'db_pool': pool_stats.snapshot(db.engine.pool)
+    })
+
+    return response
+
+
+def export_metrics():
+    body, content_type = metrics.exposition()
+    return current_app.response_class(body, content_type=content_type)
+
+
+def rebuild_grading_stats():
+    """Recomputes the grading_stats table from the assignments table"""
+    GradingStats.rebuild()
+    db.session.commit()
+
+
+def purge_idempotency_keys():
+    """Deletes the idempotency keys past their ttl"""
+    click.echo('{0} expired idempotency keys deleted'.format(IdempotencyKey.purge_expired()))
+
+
+def handle_error(err):
+    metrics.record_error(err)
+    if isinstance(err, FyleError):
+        response = APIResponse.respond_error(err.__class__.__name__, err.message, err.status_code)
+        if isinstance(err, RateLimitExceeded):
+            response.headers['Retry-After'] = str(err.retry_after)
+        return response
+    elif isinstance(err, ValidationError):
+        return APIResponse.respond_error(err.__class__.__name__, err.messages, 400)
+    elif isinstance(err, IntegrityError):
+        return APIResponse.respond_error(err.__class__.__name__, str(err.orig), 400)
+    elif isinstance(err, HTTPException):
+        return APIResponse.respond_error(err.__class__.__name__, str(err), err.code)
+
+    raise err
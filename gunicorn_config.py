@@ -1,4 +1,6 @@
 import os
+import sys
+import tempfile
 
 # https://docs.gunicorn.org/en/stable/settings.html
 
@@ -19,6 +21,25 @@ max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
 max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 20))
 graceful_timeout = int(os.environ.get('GUNICORN_WORKER_GRACEFUL_TIMEOUT', 5))
 
+# workers write their metrics here and /metrics merges them, see core/libs/metrics.py.
+# It has to be in the environment before any worker imports prometheus_client
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), '{0}-metrics'.format(proc_name)))
+
+# token buckets the workers share, see core/libs/rate_limit.py. Set it to an empty string to turn rate limiting off
+os.environ.setdefault('RATE_LIMIT_FILE', os.path.join(tempfile.gettempdir(), '{0}-rate-limits'.format(proc_name)))
+
+# the gevent worker patches in each worker too, but only after the master has imported its
+# modules, patch before the app is imported so nothing holds unpatched sockets, locks or psycopg2 waits
+if worker_class in ('gevent', 'gunicorn.workers.ggevent.GeventWorker'):
+    from gevent import monkey
+    monkey.patch_all()
+
+    from core.libs.green import patch_psycopg2
+    patch_psycopg2()
+
+# after the patching, it starts locks of its own
+from prometheus_client import multiprocess  # noqa: E402
+
 reload = True
 
 limit_request_line = 0
@@ -34,13 +55,19 @@ tmp_upload_dir = None
 
 errorlog = '-'
 accesslog = '-'
-access_log_format = '%({X-Real-IP}i)s - - - %(t)s.%(T)s "%(r)s" "%(f)s" "%(a)s" %({X-Request-Id}i)s %(L)s %(b)s %(s)s'
-# todo - JC: pass org_user_id tpa_id proxy_id and replace the three dashes in above format
+# the fyle.* fields are set per request when SERVER_TIMING_ENABLED is on (see core/libs/timing.py), else logged as -
+access_log_format = '%({X-Real-IP}i)s %({fyle.db_queries}e)s %({fyle.db_ms}e)s %({fyle.serialize_ms}e)s %({fyle.handler_ms}e)s %(t)s.%(T)s "%(r)s" "%(f)s" "%(a)s" %({X-Request-Id}i)s %(L)s %(b)s %(s)s'
 
 
 def post_fork(server, worker):
     server.log.info("Worker spawned (pid: %s)", worker.pid)
 
+    # with preload_app the master may have opened connections before forking, core/libs/db_pool.py
+    # replaces them at their first checkout in the worker. Its counters start over for the worker
+    db_pool = sys.modules.get('core.libs.db_pool')
+    if db_pool is not None:
+        db_pool.pool_stats.reset()
+
 
 def pre_fork(server, worker):
     pass
@@ -82,15 +109,33 @@ def child_exit(server, worker):
     server.log.info("server: child_exit is called")
     worker.log.info("worker: child_exit is called")
 
+    # drops the live gauges of the worker, its counters and histograms are kept
+    multiprocess.mark_process_dead(worker.pid)
+
 
 def worker_exit(server, worker):
     server.log.info("server: worker_exit is called")
     worker.log.info("worker: worker_exit is called")
 
+    server_module = sys.modules.get('core.server')
+    if server_module is not None:
+        from core.libs.db_pool import pool_stats
+        engine = server_module.db.get_engine(server_module.app)
+        worker.log.info("worker: db pool stats %s", pool_stats.snapshot(engine.pool))
+
 
 def nworkers_changed(server, new_value, old_value):
     server.log.info("server: nworkers_changed is called with new_value: %s old_value: %s", new_value, old_value)
 
 
+def on_starting(server):
+    # values left by a previous run would be merged into this one
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    os.makedirs(metrics_dir, exist_ok=True)
+    for name in os.listdir(metrics_dir):
+        if name.endswith('.db'):
+            os.remove(os.path.join(metrics_dir, name))
+
+
 def on_exit(server):
     server.log.info("server: on_exit is called")
\ No newline at end of file
@@ -2,7 +2,9 @@ import random
 from sqlalchemy import text
 
 from core import db
+from core.apis.decorators import AuthPrincipal
 from core.models.assignments import Assignment, AssignmentStateEnum, GradeEnum
+from core.models.grading_stats import GradingStats
 
 
 def create_n_graded_assignments_for_teacher(number: int = 0, teacher_id: int = 1) -> int:
@@ -98,3 +100,45 @@ def test_get_grade_A_assignments_for_teacher_with_max_grading():
     # Execute the SQL query again and check if the count matches the newly created assignments
     sql_result = db.session.execute(text(sql)).fetchall()
     assert grade_a_count_2 == sql_result[0][0]
+
+
+def _non_empty(stats):
+    return {key: counts for key, counts in stats.items() if any(counts.values())}
+
+
+def test_grading_stats_reports_match_sql_reports():
+    """Test that the reports served from grading_stats agree with the SQL reports over assignments"""
+    GradingStats.rebuild()
+    db.session.commit()
+
+    with open('tests/SQL/number_of_graded_assignments_for_each_student.sql', encoding='utf8') as fo:
+        sql_result = db.session.execute(text(fo.read())).fetchall()
+    assert sorted(tuple(row) for row in sql_result) == \
+        [tuple(row) for row in GradingStats.get_graded_counts_by_student()]
+
+    with open('tests/SQL/count_grade_A_assignments_by_teacher_with_max_grading.sql', encoding='utf8') as fo:
+        sql_result = db.session.execute(text(fo.read())).fetchall()
+    assert sql_result[0][0] == GradingStats.get_grade_a_count_for_teacher_with_max_grading()
+
+
+def test_grading_stats_follow_state_transitions():
+    """Test that every state transition keeps grading_stats equal to a full recount"""
+    GradingStats.rebuild()
+    db.session.commit()
+
+    # rolled back at the end, the graded assignments of teacher 2 would change the results of a next run
+    try:
+        student = AuthPrincipal(user_id=2, student_id=2)
+        drafts = [Assignment.upsert(Assignment(student_id=2, content='stats {0}'.format(i))) for i in range(3)]
+        for draft in drafts:
+            Assignment.submit(_id=draft.id, teacher_id=2, auth_principal=student)
+        Assignment.mark_grade(_id=drafts[0].id, grade=GradeEnum.A, auth_principal=AuthPrincipal(user_id=4, teacher_id=2))
+        Assignment.bulk_mark_grade([(drafts[1].id, GradeEnum.B)], auth_principal=AuthPrincipal(user_id=4, teacher_id=2))
+        principal = AuthPrincipal(user_id=5, principal_id=1)
+        Assignment.principal_mark_grade(_id=drafts[0].id, grade=GradeEnum.C, auth_principal=principal)
+        Assignment.bulk_principal_mark_grade([(drafts[1].id, GradeEnum.D), (drafts[2].id, GradeEnum.A)],
+                                             auth_principal=principal)
+
+        assert _non_empty(GradingStats.snapshot()) == _non_empty(GradingStats.compute())
+    finally:
+        db.session.rollback()
@@ -0,0 +1,62 @@
+"""
+Bytes saved against CPU spent by each content coding, on /principal/assignments pages of typical sizes.
+
+    python -m tests.bench.bench_compression [repeats]
+
+Rows are built like the assignment serializer dumps them, with lorem content of a few hundred bytes.
+Levels are the defaults of core/libs/compression.py plus the ends of each range, to pick COMPRESSION_*_LEVEL.
+"""
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from core.libs import compression
+
+PAGE_SIZES = (1, 10, 100, 500)
+LEVELS = {'gzip': (1, 6, 9), 'br': (1, 4, 11), 'zstd': (1, 3, 19)}
+WORDS = ('lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit', 'sed', 'do', 'eiusmod')
+
+
+def page(rows, rng):
+    started = datetime(2026, 1, 1)
+    data = []
+    for index in range(rows):
+        updated_at = started + timedelta(seconds=rng.randrange(10 ** 7))
+        data.append({
+            'id': index + 1,
+            'content': ' '.join(rng.choice(WORDS) for _ in range(rng.randrange(20, 80))),
+            'created_at': started.isoformat(),
+            'updated_at': updated_at.isoformat(),
+            'teacher_id': rng.randrange(1, 4),
+            'student_id': rng.randrange(1, 50),
+            'grade': rng.choice(('A', 'B', 'C', 'D', None)),
+            'state': rng.choice(('DRAFT', 'SUBMITTED', 'GRADED')),
+        })
+    return json.dumps({'data': data, 'next_cursor': None}).encode('utf-8')
+
+
+def measure(body, coding, level, repeats):
+    compressor = compression.Compressor(levels={coding: level})
+    compressed = compressor.compress(body, coding)
+    started_at = time.perf_counter()
+    for _ in range(repeats):
+        compressor.compress(body, coding)
+    return len(compressed), (time.perf_counter() - started_at) / repeats * 1e6
+
+
+def main(repeats=50):
+    rng = random.Random(7)
+    print('{0:>5} {1:>9}  {2:<5} {3:>5} {4:>9} {5:>7} {6:>10}'.format(
+        'rows', 'bytes', 'codec', 'level', 'out', 'ratio', 'us'))
+    for rows in PAGE_SIZES:
+        body = page(rows, rng)
+        for coding in compression.CODINGS:
+            for level in LEVELS[coding]:
+                size, took = measure(body, coding, level, repeats)
+                print('{0:>5} {1:>9}  {2:<5} {3:>5} {4:>9} {5:>7.2f} {6:>10.1f}'.format(
+                    rows, len(body), coding, level, size, len(body) / size, took))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,365 @@
+"""
+Latency and throughput of every api route against a seeded database.
+
+    python -m tests.bench.bench_endpoints [--students N] [--teachers N] [--assignments N]
+                                          [--requests N] [--live] [--concurrency N] [--output FILE]
+
+Migrates a fresh SQLite database in a temporary directory (or uses DATABASE_URL if it is set), seeds it,
+then sends `--requests` requests to each route through app.test_client(), or through a gunicorn started
+with gunicorn_config.py, rate limiting off, when `--live` is given. Prints one JSON document with p50/p95/p99 latency,
+requests/s and, in process, the number of SQL statements per request of every route.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+PORT = 7798
+BATCH_SIZE = 10
+GRADES = ['A', 'B', 'C', 'D']
+
+
+def _migrate():
+    subprocess.run([sys.executable, '-m', 'flask', 'db', 'upgrade', '-d', 'core/migrations/'],
+                   env=dict(os.environ, FLASK_APP='core/server.py'), check=True, capture_output=True)
+
+
+def _insert(table, rows):
+    from core import db
+
+    db.session.execute(table.insert(), rows)
+    return [row[0] for row in db.session.execute(
+        table.select().with_only_columns(table.c.id).order_by(table.c.id.desc()).limit(len(rows))
+    )][::-1]
+
+
+def seed(students, teachers, assignments):
+    """Adds students, teachers and assignments in every state, returns the ids the workload draws from"""
+    from core import db
+    from core.libs import helpers
+    from core.models.assignments import Assignment, AssignmentStateEnum, GradeEnum
+    from core.models.grading_stats import GradingStats
+    from core.models.principals import Principal
+    from core.models.students import Student
+    from core.models.teachers import Teacher
+    from core.models.users import User
+
+    now = helpers.get_utc_now()
+    suffix = '{0:x}'.format(int(time.time() * 1000))
+
+    def add_owners(model, kind, count):
+        user_ids = _insert(User.__table__, [
+            {'username': '{0}_{1}_{2}'.format(kind, suffix, i), 'email': '{0}_{1}_{2}@bench'.format(kind, suffix, i),
+             'created_at': now, 'updated_at': now} for i in range(count)
+        ])
+        ids = _insert(model.__table__, [{'user_id': user_id, 'created_at': now, 'updated_at': now}
+                                        for user_id in user_ids])
+        return list(zip(ids, user_ids))
+
+    student_ids = add_owners(Student, 'student', students)
+    teacher_ids = add_owners(Teacher, 'teacher', teachers)
+    principal = db.session.query(Principal.id, Principal.user_id).first()
+
+    states = [AssignmentStateEnum.DRAFT, AssignmentStateEnum.SUBMITTED, AssignmentStateEnum.GRADED]
+    rows = []
+    for i in range(assignments):
+        state = states[i % 3]
+        rows.append({
+            'student_id': student_ids[i % students][0],
+            'teacher_id': None if state == AssignmentStateEnum.DRAFT else teacher_ids[i % teachers][0],
+            'content': 'bench assignment {0}'.format(i), 'state': state,
+            'grade': GradeEnum.B if state == AssignmentStateEnum.GRADED else None,
+            'created_at': now, 'updated_at': now,
+        })
+    assignment_ids = _insert(Assignment.__table__, rows)
+    GradingStats.rebuild()
+    db.session.commit()
+
+    workload = {
+        'students': student_ids, 'teachers': teacher_ids, 'principal': tuple(principal),
+        'drafts': defaultdict(list), 'submitted': defaultdict(list), 'graded': [],
+    }
+    for _id, row in zip(assignment_ids, rows):
+        if row['state'] == AssignmentStateEnum.DRAFT:
+            workload['drafts'][row['student_id']].append(_id)
+        elif row['state'] == AssignmentStateEnum.SUBMITTED:
+            workload['submitted'][row['teacher_id']].append(_id)
+        else:
+            workload['graded'].append(_id)
+    return workload
+
+
+class Workload:
+    """
+    Builds the requests of every route. Writes draw the assignments they change from pools that
+    follow the state machine, so every request is one the api accepts.
+    """
+
+    def __init__(self, seeded):
+        self.students = seeded['students']
+        self.teachers = seeded['teachers']
+        self.principal = seeded['principal']
+        self.drafts = seeded['drafts']
+        self.submitted = seeded['submitted']
+        self.graded = seeded['graded']
+        self.random = random.Random(7)
+
+    def _student(self):
+        student_id, user_id = self.random.choice(self.students)
+        return student_id, {'X-Principal': json.dumps({'student_id': student_id, 'user_id': user_id})}
+
+    def _teacher(self):
+        teacher_id, user_id = self.random.choice(self.teachers)
+        return teacher_id, {'X-Principal': json.dumps({'teacher_id': teacher_id, 'user_id': user_id})}
+
+    def _principal(self):
+        principal_id, user_id = self.principal
+        return {'X-Principal': json.dumps({'principal_id': principal_id, 'user_id': user_id})}
+
+    def _take(self, pool, count):
+        taken, pool[:] = pool[:count], pool[count:]
+        return taken
+
+    def _student_with_drafts(self, count):
+        for student_id, user_id in self.random.sample(self.students, len(self.students)):
+            if len(self.drafts[student_id]) >= count:
+                return student_id, {'X-Principal': json.dumps({'student_id': student_id, 'user_id': user_id})}
+        return None, None
+
+    def _teacher_with_submissions(self, count):
+        for teacher_id, user_id in self.random.sample(self.teachers, len(self.teachers)):
+            if len(self.submitted[teacher_id]) >= count:
+                return teacher_id, {'X-Principal': json.dumps({'teacher_id': teacher_id, 'user_id': user_id})}
+        return None, None
+
+    def student_list(self):
+        return 'GET', '/student/assignments', self._student()[1], None
+
+    def student_upsert(self):
+        return 'POST', '/student/assignments', self._student()[1], {'content': 'bench draft'}
+
+    def student_bulk_upsert(self):
+        return 'POST', '/student/assignments/bulk', self._student()[1], \
+            [{'content': 'bench draft {0}'.format(i)} for i in range(BATCH_SIZE)]
+
+    def student_submit(self):
+        student_id, headers = self._student_with_drafts(1)
+        if student_id is None:
+            return None
+        teacher_id = self.random.choice(self.teachers)[0]
+        _id, = self._take(self.drafts[student_id], 1)
+        self.submitted[teacher_id].append(_id)
+        return 'POST', '/student/assignments/submit', headers, {'id': _id, 'teacher_id': teacher_id}
+
+    def student_bulk_submit(self):
+        student_id, headers = self._student_with_drafts(BATCH_SIZE)
+        if student_id is None:
+            return None
+        teacher_id = self.random.choice(self.teachers)[0]
+        ids = self._take(self.drafts[student_id], BATCH_SIZE)
+        self.submitted[teacher_id].extend(ids)
+        return 'POST', '/student/assignments/submit/bulk', headers, \
+            [{'id': _id, 'teacher_id': teacher_id} for _id in ids]
+
+    def teacher_list(self):
+        return 'GET', '/teacher/assignments', self._teacher()[1], None
+
+    def teacher_grade(self):
+        teacher_id, headers = self._teacher_with_submissions(1)
+        if teacher_id is None:
+            return None
+        _id, = self._take(self.submitted[teacher_id], 1)
+        self.graded.append(_id)
+        return 'POST', '/teacher/assignments/grade', headers, {'id': _id, 'grade': self.random.choice(GRADES)}
+
+    def teacher_bulk_grade(self):
+        teacher_id, headers = self._teacher_with_submissions(BATCH_SIZE)
+        if teacher_id is None:
+            return None
+        ids = self._take(self.submitted[teacher_id], BATCH_SIZE)
+        self.graded.extend(ids)
+        return 'POST', '/teacher/assignments/grade/bulk', headers, \
+            [{'id': _id, 'grade': self.random.choice(GRADES)} for _id in ids]
+
+    def principal_list(self):
+        return 'GET', '/principal/assignments', self._principal(), None
+
+    def principal_teachers(self):
+        return 'GET', '/principal/teachers', self._principal(), None
+
+    def principal_stats(self):
+        return 'GET', '/principal/stats', self._principal(), None
+
+    def principal_grade(self):
+        return 'POST', '/principal/assignments/grade', self._principal(), \
+            {'id': self.random.choice(self.graded), 'grade': self.random.choice(GRADES)}
+
+    def principal_bulk_grade(self):
+        ids = self.random.sample(self.graded, min(BATCH_SIZE, len(self.graded)))
+        return 'POST', '/principal/assignments/grade/bulk', self._principal(), \
+            [{'id': _id, 'grade': self.random.choice(GRADES)} for _id in ids]
+
+    # writes come after the reads, in the order that keeps the pools of the next ones filled
+    ROUTES = [
+        'student_list', 'teacher_list', 'principal_list', 'principal_teachers', 'principal_stats',
+        'student_upsert', 'student_bulk_upsert', 'student_submit', 'student_bulk_submit',
+        'teacher_grade', 'teacher_bulk_grade', 'principal_grade', 'principal_bulk_grade',
+    ]
+
+    def requests_for(self, route, count):
+        requests = []
+        for _ in range(count):
+            request = getattr(self, route)()
+            if request is None:
+                break
+            requests.append(request)
+        return requests
+
+
+def _failed(status_code, body):
+    """Bulk routes answer 200 with the items they could not apply in `failures`"""
+    if status_code >= 400:
+        return True
+    data = json.loads(body).get('data')
+    return isinstance(data, dict) and bool(data.get('failures'))
+
+
+def _percentile(latencies, fraction):
+    return round(latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] * 1000, 3)
+
+
+def _summary(latencies, errors, elapsed, statements=None):
+    latencies = sorted(latencies)
+    summary = {
+        'requests': len(latencies),
+        'errors': errors,
+        'req_per_s': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': _percentile(latencies, 0.5) if latencies else None,
+        'p95_ms': _percentile(latencies, 0.95) if latencies else None,
+        'p99_ms': _percentile(latencies, 0.99) if latencies else None,
+    }
+    if statements is not None:
+        summary['queries_per_request'] = round(statements / len(latencies), 2) if latencies else None
+    return summary
+
+
+def run_in_process(requests):
+    from core.server import app
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    statements = [0]
+
+    def count_statement(*args):
+        statements[0] += 1
+
+    event.listen(Engine, 'before_cursor_execute', count_statement)
+    client = app.test_client()
+    latencies, errors = [], 0
+    try:
+        started_at = time.perf_counter()
+        for method, path, headers, payload in requests:
+            request_started_at = time.perf_counter()
+            response = client.open(path, method=method, headers=headers, json=payload)
+            body = response.get_data()
+            latencies.append(time.perf_counter() - request_started_at)
+            errors += _failed(response.status_code, body)
+        elapsed = time.perf_counter() - started_at
+    finally:
+        event.remove(Engine, 'before_cursor_execute', count_statement)
+    return _summary(latencies, errors, elapsed, statements[0])
+
+
+def _send(base_url, request):
+    method, path, headers, payload = request
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    http_request = urllib.request.Request(base_url + path, data=data, method=method,
+                                          headers=dict(headers, **{'Content-Type': 'application/json'}))
+    started_at = time.perf_counter()
+    try:
+        with urllib.request.urlopen(http_request) as response:
+            status_code, body = response.status, response.read()
+    except urllib.error.HTTPError as error:
+        status_code, body = error.code, error.read()
+    return time.perf_counter() - started_at, _failed(status_code, body)
+
+
+def run_live(base_url, requests, concurrency):
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda request: _send(base_url, request), requests))
+    elapsed = time.perf_counter() - started_at
+    return _summary([latency for latency, _ in results], sum(failed for _, failed in results), elapsed)
+
+
+def _start_gunicorn():
+    server = subprocess.Popen(
+        ['gunicorn', '-c', 'gunicorn_config.py', '--access-logfile', '/dev/null', 'core.server:app'],
+        env=dict(os.environ, GUNICORN_PORT=str(PORT), GUNICORN_LOG_LEVEL='warning', RATE_LIMIT_FILE='')
+    )
+    base_url = 'http://127.0.0.1:{0}'.format(PORT)
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(base_url + '/').read()
+            return server, base_url
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError('gunicorn did not start on {0}'.format(base_url))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=50)
+    parser.add_argument('--teachers', type=int, default=10)
+    parser.add_argument('--assignments', type=int, default=6000)
+    parser.add_argument('--requests', type=int, default=100, help='requests per route')
+    parser.add_argument('--live', action='store_true', help='send the requests to a gunicorn instead')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients with --live')
+    parser.add_argument('--output', help='write the report to this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    from core.server import app
+    if 'DATABASE_URL' not in os.environ:
+        os.environ['DATABASE_URL'] = 'sqlite:///{0}/store.sqlite3'.format(tempfile.mkdtemp())
+        _migrate()
+        # importing the tests package has already set the app up with the default database
+        app.config['SQLALCHEMY_DATABASE_URI'] = os.environ['DATABASE_URL']
+
+    with app.app_context():
+        workload = Workload(seed(args.students, args.teachers, args.assignments))
+
+    server, base_url = _start_gunicorn() if args.live else (None, None)
+    routes = {}
+    try:
+        for route in Workload.ROUTES:
+            requests = workload.requests_for(route, args.requests)
+            routes[route] = run_live(base_url, requests, args.concurrency) if args.live else run_in_process(requests)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = json.dumps({
+        'mode': 'live' if args.live else 'in_process',
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'routes': routes,
+    }, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
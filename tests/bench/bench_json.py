@@ -0,0 +1,38 @@
+"""
+Time to encode /principal/assignments payloads with each JSON encoder of core/libs/json_encoders.py.
+
+    python -m tests.bench.bench_json [repeats]
+
+The rows are serializer output, so apart from the HTTP date of one datetime this is dict, str and int
+encoding, which is what a page of assignments costs.
+"""
+import random
+import sys
+import time
+from datetime import datetime
+from flask import json
+from core.libs import json_encoders
+from tests.bench.bench_compression import PAGE_SIZES, page
+
+
+def measure(encoder, payload, repeats):
+    encoder.encode_bytes(payload)
+    started_at = time.perf_counter()
+    for _ in range(repeats):
+        encoder.encode_bytes(payload)
+    return (time.perf_counter() - started_at) / repeats * 1e6
+
+
+def main(repeats=200):
+    rng = random.Random(7)
+    encoders = [json_encoders.get_encoder(name) for name in ('stdlib', 'orjson')]
+    print('{0:>5} {1:>10} {2:>10} {3:>8}'.format('rows', 'stdlib us', 'orjson us', 'speedup'))
+    for rows in PAGE_SIZES:
+        payload = json.loads(page(rows, rng))
+        payload['time'] = datetime(2026, 1, 1)
+        stdlib, fast = (measure(encoder, payload, repeats) for encoder in encoders)
+        print('{0:>5} {1:>10.1f} {2:>10.1f} {3:>7.1f}x'.format(rows, stdlib, fast, stdlib / fast))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,49 @@
+"""
+Cost of the metric updates made for every request (in-flight gauge up and down, latency histogram,
+request counter), done the way the request hooks in core/libs/metrics.py do them.
+
+    python -m tests.bench.bench_metrics [requests]
+
+Measured in a fresh interpreter per mode, since prometheus_client picks its value storage at import:
+in-process values, and the mmap'ed files used under gunicorn (PROMETHEUS_MULTIPROC_DIR).
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+MEASURE = '''
+import time
+from core.libs import metrics
+
+def record():
+    metrics._child(metrics.IN_FLIGHT, '/principal/assignments').inc()
+    metrics._child(metrics.REQUEST_LATENCY, '/principal/assignments', 'GET').observe(0.0123)
+    metrics._child(metrics.REQUESTS, '/principal/assignments', 'GET', 200).inc()
+    metrics._child(metrics.IN_FLIGHT, '/principal/assignments').dec()
+
+requests = {requests}
+record()
+started_at = time.perf_counter()
+for _ in range(requests):
+    record()
+print((time.perf_counter() - started_at) / requests * 1e6)
+'''
+
+
+def measure(requests, environ):
+    output = subprocess.run([sys.executable, '-c', MEASURE.format(requests=requests)],
+                            env=environ, check=True, capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def main(requests=100000):
+    environ = {key: value for key, value in os.environ.items() if key != 'PROMETHEUS_MULTIPROC_DIR'}
+    print('{0:<14} {1:>6.2f} us/request'.format('in process', measure(requests, environ)))
+    with tempfile.TemporaryDirectory() as metrics_dir:
+        print('{0:<14} {1:>6.2f} us/request'.format(
+            'multiprocess', measure(requests, dict(environ, PROMETHEUS_MULTIPROC_DIR=metrics_dir))))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
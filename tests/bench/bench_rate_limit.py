@@ -0,0 +1,46 @@
+"""
+Cost of a rate limit check (RateLimiter.take), alone and with processes checking the same file at once.
+
+    python -m tests.bench.bench_rate_limit [checks] [processes]
+
+Keys are spread over 200 users, as a busy server would see them.
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from core.libs.rate_limit import RateLimiter
+
+
+def measure(path, checks):
+    limiter = RateLimiter(path, capacity=1e9, refill_rate=1e9)
+    limiter.take(0)
+    started_at = time.perf_counter()
+    for index in range(checks):
+        limiter.take(index % 200)
+    return (time.perf_counter() - started_at) / checks * 1e6
+
+
+def _worker(path, checks, results):
+    results.put(measure(path, checks))
+
+
+def main(checks=100000, processes=4):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'rate-limits')
+        print('{0:<22} {1:>6.2f} us/check'.format('1 process', measure(path, checks)))
+
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=_worker, args=(path, checks, results)) for _ in range(processes)]
+        for worker in workers:
+            worker.start()
+        timings = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        print('{0:<22} {1:>6.2f} us/check'.format('{0} processes at once'.format(processes),
+                                                 sum(timings) / len(timings)))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
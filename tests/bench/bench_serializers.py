@@ -0,0 +1,39 @@
+"""
+Micro-benchmark for the dump paths of the list endpoints.
+
+    python -m tests.bench.bench_serializers [rows] [repeat]
+"""
+import sys
+import timeit
+from core.apis.assignments.schema import AssignmentSchema, assignment_serializer
+from core.libs import helpers
+from core.models.assignments import Assignment, AssignmentStateEnum, GradeEnum
+
+
+def make_assignments(rows):
+    now = helpers.get_utc_now()
+    return [
+        Assignment(id=i, student_id=i % 50, teacher_id=i % 7, content='content {0}'.format(i),
+                   grade=GradeEnum.A, state=AssignmentStateEnum.GRADED, created_at=now, updated_at=now)
+        for i in range(rows)
+    ]
+
+
+def main(rows=1000, repeat=20):
+    assignments = make_assignments(rows)
+    assert assignment_serializer.dump_many(assignments) == AssignmentSchema().dump(assignments, many=True)
+
+    results = {
+        'marshmallow': min(timeit.repeat(lambda: AssignmentSchema().dump(assignments, many=True),
+                                         number=1, repeat=repeat)),
+        'serializer': min(timeit.repeat(lambda: assignment_serializer.dump_many(assignments),
+                                        number=1, repeat=repeat)),
+    }
+    for name, seconds in results.items():
+        print('{0:<12} {1:>8.2f} ms / {2} rows  {3:>6.2f} us/row'.format(
+            name, seconds * 1000, rows, seconds * 1e6 / rows))
+    print('speedup      {0:>8.1f}x'.format(results['marshmallow'] / results['serializer']))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,120 @@
+"""
+Read throughput of several worker processes sharing one SQLite file while another process keeps grading.
+
+    python -m tests.bench.bench_sqlite [readers] [seconds] [rows]
+
+Runs once with SQLite's default pragmas and once with the profile from core/config.py,
+each against a freshly migrated database in a temporary directory.
+"""
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+H_PRINCIPAL = {'X-Principal': json.dumps({'user_id': 5, 'principal_id': 1})}
+
+# what SQLite does when none of the pragmas are set
+DEFAULT_PRAGMAS = {
+    'SQLITE_JOURNAL_MODE': 'DELETE',
+    'SQLITE_SYNCHRONOUS': 'FULL',
+    'SQLITE_MMAP_SIZE': '0',
+    'SQLITE_CACHE_SIZE': '-2000',
+    'SQLITE_TEMP_STORE': 'DEFAULT',
+}
+
+
+def _seed(rows):
+    from core import db
+    from core.libs import helpers
+    from core.models.assignments import Assignment, AssignmentStateEnum, GradeEnum
+    from core.server import app
+
+    with app.app_context():
+        now = helpers.get_utc_now()
+        db.session.execute(Assignment.__table__.insert(), [
+            {'student_id': 1 + i % 2, 'teacher_id': 1 + i % 2, 'content': 'bench {0}'.format(i),
+             'state': AssignmentStateEnum.GRADED, 'grade': GradeEnum.B, 'created_at': now, 'updated_at': now}
+            for i in range(rows)
+        ])
+        db.session.commit()
+        return [row.id for row in db.session.query(Assignment.id).filter(Assignment.content.like('bench %'))]
+
+
+def _reader(deadline, results):
+    from core.server import app
+
+    client = app.test_client()
+    latencies, errors = [], 0
+    started_at = time.time()
+    while time.time() < deadline:
+        request_started_at = time.perf_counter()
+        response = client.get('/principal/assignments?limit=100', headers=H_PRINCIPAL)
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - request_started_at)
+        else:
+            errors += 1
+    results.put(('read', len(latencies) / (deadline - started_at), errors, latencies))
+
+
+def _writer(deadline, ids, results):
+    from core.server import app
+
+    client = app.test_client()
+    writes = errors = 0
+    started_at = time.time()
+    while time.time() < deadline:
+        response = client.post('/principal/assignments/grade', headers=H_PRINCIPAL,
+                               json={'id': ids[writes % len(ids)], 'grade': 'ABCD'[writes % 4]})
+        if response.status_code == 200:
+            writes += 1
+        else:
+            errors += 1
+    results.put(('write', writes / (deadline - started_at), errors, []))
+
+
+def run(name, pragmas, readers, seconds, rows):
+    directory = tempfile.mkdtemp()
+    os.environ.update(pragmas, DATABASE_URL='sqlite:///{0}/store.sqlite3'.format(directory))
+    subprocess.run([sys.executable, '-m', 'flask', 'db', 'upgrade', '-d', 'core/migrations/'],
+                   env=dict(os.environ, FLASK_APP='core/server.py'), check=True, capture_output=True)
+
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        ids = pool.apply(_seed, (rows,))
+
+    results = context.Queue()
+    # the window starts once a process has imported the app, which takes a moment after spawning
+    deadline = time.time() + 2 + seconds
+    processes = [context.Process(target=_reader, args=(deadline, results)) for _ in range(readers)]
+    processes.append(context.Process(target=_writer, args=(deadline, ids, results)))
+    for process in processes:
+        process.start()
+    totals = {'read': [0, 0], 'write': [0, 0]}
+    read_latencies = []
+    for _ in processes:
+        kind, rate, errors, latencies = results.get()
+        totals[kind][0] += rate
+        totals[kind][1] += errors
+        read_latencies.extend(latencies)
+    for process in processes:
+        process.join()
+
+    read_latencies.sort()
+    print('{0:<8} reads {1:>8.1f}/s ({2} errors)  read p99 {3:>7.1f} ms  writes {4:>7.1f}/s ({5} errors)'.format(
+        name, totals['read'][0], totals['read'][1], read_latencies[int(len(read_latencies) * 0.99)] * 1000,
+        totals['write'][0], totals['write'][1]))
+
+
+def main(readers=4, seconds=5, rows=2000):
+    environ = dict(os.environ)
+    run('default', DEFAULT_PRAGMAS, readers, seconds, rows)
+    os.environ.clear()
+    os.environ.update(environ)
+    run('profile', {}, readers, seconds, rows)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
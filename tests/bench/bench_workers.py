@@ -0,0 +1,89 @@
+"""
+Throughput of the sync and gevent worker classes on an I/O-bound endpoint.
+
+    python -m tests.bench.bench_workers [concurrency] [requests] [latency_ms]
+
+Starts gunicorn with gunicorn_config.py once per worker class, serving the app behind a middleware
+that waits `latency_ms` before each request, standing in for a slow upstream or postgres round trip.
+Needs a migrated database, see run.sh.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+PORT = 7799
+PATH = '/principal/assignments'
+HEADERS = {'X-Principal': json.dumps({'user_id': 5, 'principal_id': 1})}
+
+
+def _latency_middleware(wsgi_app, latency_ms):
+    def middleware(environ, start_response):
+        # time.sleep yields to the hub when the worker has been monkey-patched
+        time.sleep(latency_ms / 1000)
+        return wsgi_app(environ, start_response)
+    return middleware
+
+
+def create_app():
+    from core.server import app
+    return _latency_middleware(app.wsgi_app, int(os.environ.get('BENCH_LATENCY_MS', 50)))
+
+
+def _get(url):
+    started_at = time.perf_counter()
+    with urllib.request.urlopen(urllib.request.Request(url, headers=HEADERS)) as response:
+        response.read()
+    return time.perf_counter() - started_at
+
+
+def _wait_until_up(url, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _get(url)
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('gunicorn did not start on {0}'.format(url))
+
+
+def run(worker_class, concurrency, requests, latency_ms):
+    env = dict(os.environ, GUNICORN_WORKER_CLASS=worker_class, GUNICORN_PORT=str(PORT),
+               GUNICORN_NUMBER_WORKER_CONNECTIONS=str(concurrency), GUNICORN_LOG_LEVEL='warning',
+               BENCH_LATENCY_MS=str(latency_ms), RATE_LIMIT_FILE='')
+    server = subprocess.Popen(
+        ['gunicorn', '-c', 'gunicorn_config.py', '--access-logfile', '/dev/null',
+         'tests.bench.bench_workers:create_app()'],
+        env=env
+    )
+    url = 'http://127.0.0.1:{0}{1}'.format(PORT, PATH)
+    try:
+        _wait_until_up(url)
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = sorted(executor.map(lambda _: _get(url), range(requests)))
+        elapsed = time.perf_counter() - started_at
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        'worker_class': worker_class,
+        'req_per_s': round(requests / elapsed, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 1),
+    }
+
+
+def main(concurrency=50, requests=500, latency_ms=50):
+    for worker_class in ('sync', 'gevent'):
+        result = run(worker_class, concurrency, requests, latency_ms)
+        print('{worker_class:<8} {req_per_s:>8} req/s  p50 {p50_ms:>8} ms  p95 {p95_ms:>8} ms'.format(**result))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -1,6 +1,9 @@
 import pytest
 import json
 from tests import app
+from core import db
+from core.models.assignments import Assignment
+from core.models.grading_stats import GradingStats
 
 
 @pytest.fixture
@@ -66,3 +69,17 @@ def h_principal():
     }
 
     return headers
+
+
+@pytest.fixture
+def delete_created_assignments():
+    """Deletes the assignments the test creates, so that a next run of the suite starts from the same rows"""
+    last_id = db.session.query(db.func.max(Assignment.id)).scalar() or 0
+    db.session.commit()
+
+    yield
+
+    db.session.rollback()
+    Assignment.filter(Assignment.id > last_id).delete(synchronize_session=False)
+    GradingStats.rebuild()
+    db.session.commit()
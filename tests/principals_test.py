@@ -1,5 +1,8 @@
+import json
 from core import db
 from core.models.assignments import Assignment, AssignmentStateEnum, GradeEnum
+from core.models.grading_stats import GradingStats
+from core.models.teachers import Teacher
 
 
 def test_get_assignments(client, h_principal):
@@ -214,6 +217,108 @@ def test_principal_grade_invalid_grade(client, h_principal):
     )
     assert response.status_code == 400
 
+def test_get_assignments_not_modified(client, h_principal):
+    response = client.get('/principal/assignments', headers=h_principal)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    not_modified_response = client.get('/principal/assignments', headers={**h_principal, 'If-None-Match': etag})
+    assert not_modified_response.status_code == 304
+    assert not_modified_response.get_data() == b''
+    assert not_modified_response.headers['ETag'] == etag
+
+    assignment = response.json['data'][0]
+    client.post(
+        '/principal/assignments/grade',
+        json={'id': assignment['id'], 'grade': GradeEnum.D.value},
+        headers=h_principal
+    )
+
+    modified_response = client.get('/principal/assignments', headers={**h_principal, 'If-None-Match': etag})
+    assert modified_response.status_code == 200
+    assert modified_response.headers['ETag'] != etag
+
+def test_principal_bulk_grade_assignments(client, h_principal):
+    h_student = {'X-Principal': json.dumps({'student_id': 2, 'user_id': 2})}
+    draft_id = client.post('/student/assignments', headers=h_student,
+                           json={'content': 'bulk draft'}).json['data']['id']
+    submitted_id = client.post('/student/assignments', headers=h_student,
+                               json={'content': 'bulk submitted'}).json['data']['id']
+    client.post('/student/assignments/submit', headers=h_student, json={'id': submitted_id, 'teacher_id': 2})
+
+    response = client.post(
+        '/principal/assignments/grade/bulk',
+        json=[
+            {'id': draft_id, 'grade': GradeEnum.A.value},
+            {'id': submitted_id, 'grade': GradeEnum.B.value},
+        ],
+        headers=h_principal
+    )
+    assert response.status_code == 200
+    assert [assignment['id'] for assignment in response.json['data']['graded']] == [submitted_id]
+    assert response.json['data']['graded'][0]['grade'] == GradeEnum.B.value
+    assert response.json['data']['failures'] == [{
+        'id': draft_id,
+        'error': 'FyleError',
+        'message': 'Draft assignments cannot be graded by principal',
+        'status_code': 400
+    }]
+
+
+def test_principal_bulk_grade_repeated_id(client, h_principal):
+    h_student = {'X-Principal': json.dumps({'student_id': 2, 'user_id': 2})}
+    submitted_id = client.post('/student/assignments', headers=h_student,
+                               json={'content': 'bulk repeated'}).json['data']['id']
+    client.post('/student/assignments/submit', headers=h_student, json={'id': submitted_id, 'teacher_id': 2})
+
+    response = client.post(
+        '/principal/assignments/grade/bulk',
+        json=[
+            {'id': str(submitted_id), 'grade': GradeEnum.A.value},
+            {'id': submitted_id, 'grade': GradeEnum.B.value},
+        ],
+        headers=h_principal
+    )
+    assert [assignment['id'] for assignment in response.json['data']['graded']] == [submitted_id]
+    assert response.json['data']['failures'] == [
+        {'index': 1, 'error': 'ValidationError', 'message': 'duplicate id in batch'}
+    ]
+    key = (GradingStats.STUDENT, 2)
+    assert GradingStats.snapshot()[key] == GradingStats.compute()[key]
+
+
+def test_principal_stats(client, h_principal):
+    GradingStats.rebuild()
+    db.session.commit()
+
+    response = client.get('/principal/stats', headers=h_principal)
+    assert response.status_code == 200
+    stats = response.json['data']
+    assert response.headers['Server-Timing'].startswith('stats;dur=')
+
+    graded = Assignment.filter(Assignment.state == AssignmentStateEnum.GRADED).all()
+    assert stats['grade_histogram'] == {
+        grade.value: sum(1 for assignment in graded if assignment.grade == grade) for grade in GradeEnum
+    }
+    for teacher_stats in stats['teachers']:
+        assert teacher_stats['states']['GRADED'] == sum(
+            1 for assignment in graded if assignment.teacher_id == teacher_stats['teacher_id'])
+    assert stats['grade_a_count_for_teacher_with_max_grading'] == \
+        GradingStats.get_grade_a_count_for_teacher_with_max_grading()
+
+    # served from the cache until a grade is written
+    cached = client.get('/principal/stats', headers=h_principal)
+    assert cached.json['data'] == stats
+    assert cached.headers['Server-Timing'] == 'stats;desc="cached"'
+    regraded = next(assignment for assignment in graded if assignment.grade != GradeEnum.A)
+    previous_grade = regraded.grade.value
+    client.post('/principal/assignments/grade', json={'id': regraded.id, 'grade': GradeEnum.A.value},
+                headers=h_principal)
+
+    histogram = client.get('/principal/stats', headers=h_principal).json['data']['grade_histogram']
+    assert histogram['A'] == stats['grade_histogram']['A'] + 1
+    assert histogram[previous_grade] == stats['grade_histogram'][previous_grade] - 1
+
 def test_principal_view_empty_assignments(client, h_principal):
     # Clear all assignments before this test
     Assignment.query.delete()
@@ -222,3 +327,21 @@ def test_principal_view_empty_assignments(client, h_principal):
     response = client.get('/principal/assignments', headers=h_principal)
     assert response.status_code == 200
     assert len(response.json['data']) == 0
+
+def test_list_teachers_cache_invalidation(client, h_principal):
+    first_response = client.get('/principal/teachers', headers=h_principal)
+    cached_response = client.get('/principal/teachers', headers=h_principal)
+    assert cached_response.get_data() == first_response.get_data()
+
+    teacher = Teacher(user_id=3)
+    db.session.add(teacher)
+    db.session.commit()
+
+    response = client.get('/principal/teachers', headers=h_principal)
+    assert teacher.id in [t['id'] for t in response.json['data']]
+
+    db.session.delete(teacher)
+    db.session.commit()
+
+    response = client.get('/principal/teachers', headers=h_principal)
+    assert response.get_data() == first_response.get_data()
@@ -0,0 +1,92 @@
+import uuid
+import pytest
+from datetime import date, datetime, timezone
+from flask import json, jsonify
+from core import app, db
+from core.apis.assignments.schema import AssignmentSchema, assignment_serializer
+from core.apis.teachers.schema import TeacherSchema, teacher_serializer
+from core.libs.json_encoders import OrjsonEncoder, StdlibEncoder
+from core.models.assignments import Assignment, AssignmentStateEnum, GradeEnum
+from core.models.teachers import Teacher
+
+
+@pytest.fixture
+def stored_assignment():
+    assignment = Assignment(student_id=1, content='serializer parity')
+    db.session.add(assignment)
+    db.session.commit()
+
+    yield assignment
+
+    # delete it again so that the ids handed out to later tests do not shift
+    db.session.delete(assignment)
+    db.session.commit()
+
+
+def test_assignment_serializer_parity(stored_assignment):
+    assignments = Assignment.query.all() + [
+        Assignment(id=None, student_id=1, content=None, state=AssignmentStateEnum.DRAFT,
+                   created_at=datetime(2024, 1, 1), updated_at=datetime(2024, 1, 1)),
+        Assignment(id=7, student_id=2, teacher_id=1, content='graded', grade=GradeEnum.B,
+                   state=AssignmentStateEnum.GRADED, created_at=datetime(2024, 1, 1, tzinfo=timezone.utc),
+                   updated_at=datetime(2024, 1, 2, 3, 4, 5, 678, tzinfo=timezone.utc)),
+    ]
+    expected = AssignmentSchema().dump(assignments, many=True)
+    actual = assignment_serializer.dump_many(assignments)
+
+    assert actual == expected
+    assert json.dumps(actual) == json.dumps(expected)
+
+
+def test_assignment_serializer_rows(stored_assignment):
+    rows = db.session.query(*Assignment.__table__.columns).all()
+    expected = AssignmentSchema().dump(Assignment.query.all(), many=True)
+
+    assert sorted(assignment_serializer.dump_many(rows), key=lambda a: a['id']) == \
+        sorted(expected, key=lambda a: a['id'])
+
+
+def test_teacher_serializer_parity():
+    teachers = Teacher.get_all()
+    assert len(teachers) > 0
+
+    expected = TeacherSchema(many=True).dump(teachers)
+    actual = teacher_serializer.dump_many(teachers)
+
+    assert actual == expected
+    assert json.dumps(actual) == json.dumps(expected)
+
+
+def test_assignment_serializer_only(stored_assignment):
+    fields = ('id', 'state', 'grade', 'updated_at')
+    expected = AssignmentSchema(only=fields).dump(stored_assignment)
+
+    assert assignment_serializer.dump(stored_assignment, only=fields) == expected
+    assert assignment_serializer.dumper(fields) is assignment_serializer.dumper(fields)
+
+
+def test_json_encoders_parity(stored_assignment):
+    payload = {
+        'data': assignment_serializer.dump_many(Assignment.query.all()),
+        'next_cursor': None,
+        'raw': [GradeEnum.A, AssignmentStateEnum.GRADED, datetime(2024, 1, 2, 3, 4, 5, 678),
+                datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc), date(2024, 1, 1),
+                uuid.UUID(int=1), 0.125, True, -3, {'b': 1, 'a': [None]}],
+    }
+    with app.app_context():
+        expected = jsonify(payload).get_data()
+
+    assert StdlibEncoder().encode_bytes(payload) == expected
+    assert OrjsonEncoder().encode_bytes(payload) == expected
+
+    text = {'content': 'caf\u00e9'}
+    assert json.loads(OrjsonEncoder().encode_bytes(text)) == json.loads(StdlibEncoder().encode_bytes(text))
+
+
+def test_json_encoders_rows(stored_assignment):
+    rows = db.session.query(Assignment.id, Assignment.grade, Assignment.state).filter(
+        Assignment.id == stored_assignment.id).all()
+    expected = [{'id': stored_assignment.id, 'grade': None, 'state': 'DRAFT'}]
+
+    assert json.loads(StdlibEncoder().encode_bytes(rows)) == expected
+    assert OrjsonEncoder().encode_bytes(rows) == StdlibEncoder().encode_bytes(rows)
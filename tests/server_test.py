@@ -0,0 +1,371 @@
+import gzip
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import brotli
+import pytest
+from core import app, config, create_app, db
+from core.libs import compression, rate_limit, timing
+from core.libs.db_pool import InstrumentedQueuePool, pool_stats
+from core.libs.slow_queries import SlowQueryLog, normalize
+from core.models.assignments import Assignment
+from core.models.teachers import Teacher
+from sqlalchemy import create_engine, event, exc, false, text, update
+from sqlalchemy.engine import Engine
+from werkzeug.test import EnvironBuilder
+
+
+@pytest.fixture
+def replica(tmp_path):
+    """A copy of the primary database standing in for a read replica"""
+    path = tmp_path / 'replica.sqlite3'
+    source, target = sqlite3.connect(db.engine.url.database), sqlite3.connect(str(path))
+    source.backup(target)
+    source.close()
+    target.close()
+
+    db.replicas.configure(['sqlite:///{0}'.format(path)])
+    yield path
+    db.get_engine(bind='replica_0').dispose()
+    db.replicas.configure([])
+
+
+def test_ready(client):
+    response = client.get('/')
+
+    assert response.status_code == 200
+    assert response.json['status'] == 'ready'
+    assert response.json['db_pool']['checkouts'] > 0
+    assert response.json['db_pool']['checked_out'] >= 0
+
+
+def test_pool_stats_record_waits_and_timeouts():
+    engine = create_engine('sqlite://', poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0,
+                           pool_timeout=0.05)
+    before = pool_stats.snapshot()
+
+    held = engine.connect()
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+
+    stats = pool_stats.snapshot(engine.pool)
+    assert stats['timeouts'] == before['timeouts'] + 1
+    assert stats['wait_ms_max'] >= 50
+    assert stats['size'] == 1 and stats['overflow'] == 0
+    assert stats['checked_out'] == before['checked_out'] + 1
+
+    held.close()
+    engine.dispose()
+
+
+def test_pool_replaces_connections_opened_before_fork(tmp_path):
+    engine = create_engine('sqlite:///{0}'.format(tmp_path / 'fork.sqlite3'), poolclass=InstrumentedQueuePool,
+                           pool_size=1, max_overflow=0)
+    with engine.connect() as connection:
+        parents = connection.connection.connection
+
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # the child's checkout gets a connection of its own, the parent's is left open
+        with engine.connect() as connection:
+            replaced = connection.connection.connection is not parents
+        os.write(write, b'1' if replaced else b'0')
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read, 1) == b'1'
+    os.close(read)
+    os.close(write)
+
+    with engine.connect() as connection:
+        assert connection.connection.connection is parents
+        assert connection.exec_driver_sql('select 1').scalar() == 1
+    engine.dispose()
+
+
+def _add_replica_only_assignment(path):
+    connection = sqlite3.connect(str(path))
+    connection.execute(
+        "INSERT INTO assignments (student_id, teacher_id, content, state, created_at, updated_at) "
+        "VALUES (1, 1, 'replica only', 'SUBMITTED', '2026-01-01 00:00:00', '2026-01-01 00:00:00')"
+    )
+    connection.commit()
+    connection.close()
+
+
+def test_get_reads_from_replica(client, h_principal, replica):
+    _add_replica_only_assignment(replica)
+
+    response = client.get('/principal/assignments', headers=h_principal)
+    assert response.status_code == 200
+    assert 'replica only' in [assignment['content'] for assignment in response.json['data']]
+
+    # outside of api GET requests everything stays on the primary
+    assert Assignment.filter(Assignment.content == 'replica only').count() == 0
+
+
+def test_reads_after_a_write_stay_on_primary(replica):
+    _add_replica_only_assignment(replica)
+
+    with app.test_request_context('/principal/assignments', method='GET'):
+        db.session.info['read_replica'] = True
+        assert Assignment.filter(Assignment.content == 'replica only').count() == 1
+
+        db.session.execute(update(Assignment).where(false()).values(content='unchanged'))
+        assert Assignment.filter(Assignment.content == 'replica only').count() == 0
+        db.session.rollback()
+
+
+def test_unhealthy_replica_falls_back_to_primary(client, h_principal, tmp_path):
+    db.replicas.configure(['sqlite:///{0}/missing/replica.sqlite3'.format(tmp_path)])
+    try:
+        response = client.get('/principal/assignments', headers=h_principal)
+        assert response.status_code == 200
+        assert db.replicas.choose() is None
+    finally:
+        db.replicas.configure([])
+
+
+def test_server_timing(h_principal):
+    # on an app of its own, hooks added to the shared app would stay there for the tests after this one
+    timed = create_app()
+    installed = timing._installed
+    timing.init_app(timed)
+
+    try:
+        response = timed.test_client().get('/principal/assignments', headers=h_principal)
+        assert response.status_code == 200
+
+        metrics = dict(entry.split(';', 1) for entry in response.headers['Server-Timing'].split(', '))
+        assert set(metrics) == {'db', 'serialize', 'handler', 'total'}
+        assert metrics['db'].endswith('desc="2 queries"')
+
+        # kept after the metrics the handler sets
+        stats_timing = timed.test_client().get('/principal/stats', headers=h_principal).headers['Server-Timing']
+        assert {entry.split(';', 1)[0] for entry in stats_timing.split(', ')} == \
+            {'stats', 'db', 'serialize', 'handler', 'total'}
+
+        # the access log reads the same figures from the wsgi environ
+        environ = EnvironBuilder('/principal/assignments', headers=h_principal).get_environ()
+        b''.join(timed(environ, lambda status, headers: None))
+        assert environ['fyle.db_queries'] == '2'
+        assert float(environ['fyle.serialize_ms']) > 0
+    finally:
+        if not installed:
+            event.remove(Engine, 'before_cursor_execute', timing._before_cursor_execute)
+            event.remove(Engine, 'after_cursor_execute', timing._after_cursor_execute)
+            timing._installed = False
+        db.get_engine(timed).dispose()
+
+
+def test_metrics(client, h_principal):
+    client.get('/principal/assignments', headers=h_principal)
+    client.post('/principal/assignments/grade', json={'id': 100000, 'grade': 'A'}, headers=h_principal)
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert 'fyle_http_requests_total{method="GET",route="/principal/assignments",status="200"}' in body
+    assert 'fyle_http_request_duration_seconds_bucket{le="0.005",method="GET",route="/principal/assignments"}' in body
+    assert 'fyle_http_requests_total{method="POST",route="/principal/assignments/grade",status="404"}' in body
+    assert 'fyle_errors_total{error="FyleError"}' in body
+    assert 'fyle_db_pool_checked_out' in body
+
+
+def test_slow_query_log(client, tmp_path):
+    h_teacher = {'X-Principal': json.dumps({'teacher_id': 1, 'user_id': 3})}
+    path = tmp_path / 'slow_queries.log'
+    slow_query_log = SlowQueryLog(0, explain_sample_rate=1, path=str(path)).install()
+    try:
+        assert client.get('/teacher/assignments', headers=h_teacher).status_code == 200
+        slow_query_log.flush()
+    finally:
+        slow_query_log.uninstall()
+
+    entries = [json.loads(line.split(' ', 2)[2]) for line in path.read_text().splitlines()]
+    page_query = next(entry for entry in entries
+                      if entry['caller'] == 'Assignment.get_assignments_by_teacher' and 'plan' not in entry)
+    assert page_query['route'] == 'GET /teacher/assignments'
+    assert 'int' in page_query['parameters']
+    plans = [entry for entry in entries if 'plan' in entry and entry['sql'] == page_query['sql']]
+    assert any('ix_assignments_teacher_id_state' in line for line in plans[0]['plan'])
+
+
+def test_slow_query_log_per_app(tmp_path, monkeypatch):
+    path = tmp_path / 'slow_queries.log'
+    monkeypatch.setattr(config, 'SLOW_QUERY_THRESHOLD_MS', 0)
+    monkeypatch.setattr(config, 'SLOW_QUERY_EXPLAIN_SAMPLE_RATE', 0)
+    monkeypatch.setattr(config, 'SLOW_QUERY_LOG_FILE', str(path))
+    apps = [create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///{0}'.format(tmp_path / 'app{0}.sqlite3'.format(index))})
+            for index in range(2)]
+
+    try:
+        with apps[0].app_context():
+            db.session.execute(text('SELECT 42'))
+            db.session.remove()
+    finally:
+        for other in apps:
+            other.extensions['slow_query_log'].uninstall()
+            db.get_engine(other).dispose()
+
+    entries = [json.loads(line.split(' ', 2)[2]) for line in path.read_text().splitlines()]
+    assert [entry['sql'] for entry in entries] == ['SELECT 42']
+
+
+def test_slow_query_normalize():
+    assert normalize('SELECT *\n  FROM assignments WHERE id IN (?, ?,?)') == \
+        'SELECT * FROM assignments WHERE id IN (?, ...)'
+
+
+def test_compression_negotiation():
+    compressor = compression.Compressor(min_size=100)
+    body = json.dumps({'data': [{'state': 'GRADED', 'grade': 'A'}] * 50}).encode('utf-8')
+
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip;q=0.5, br'}):
+        response = compressor.after_request(app.response_class(body, mimetype='application/json'))
+    assert response.headers['Content-Encoding'] == 'br'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert brotli.decompress(response.get_data()) == body
+
+    with app.test_request_context(headers={'Accept-Encoding': 'identity'}):
+        response = compressor.after_request(app.response_class(body, mimetype='application/json'))
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['Vary'] == 'Accept-Encoding'
+
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = compressor.after_request(app.response_class(body[:50], mimetype='application/json'))
+    assert 'Content-Encoding' not in response.headers and 'Vary' not in response.headers
+
+
+def test_compression_of_cached_body(client, h_principal, monkeypatch):
+    compressor = app.extensions['compression']
+    monkeypatch.setattr(compressor, 'min_size', 0)
+    plain = client.get('/principal/teachers', headers=h_principal)
+
+    response = client.get('/principal/teachers', headers=dict(h_principal, **{'Accept-Encoding': 'gzip'}))
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.data)) == plain.json
+    cached = Teacher.cache.get('all')
+    assert cached.variant('gzip', compressor) is cached.variant('gzip', compressor)
+
+
+def _import_times(module):
+    """{module: (self ms, cumulative ms)} of a cold `import module`, from python -X importtime"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {0}'.format(module)],
+                            capture_output=True, text=True, check=True).stderr
+    times = {}
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and 'imported package' not in line:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            times[name.strip()] = (int(self_us) / 1000, int(cumulative_us) / 1000)
+    return times
+
+
+def test_import_time_budget():
+    core_times = _import_times('core')
+    assert not {'core.routes', 'core.apis', 'marshmallow', 'flask_migrate'} & set(core_times)
+
+    times = _import_times('core.server')
+    assert not {'flask_migrate', 'alembic'} & set(times)
+    # the code of this repo, and everything importing it pulls in, against budgets about 3x what they are now.
+    # Raise them knowingly if a change is worth the slower worker boot
+    own_ms = sum(self_ms for name, (self_ms, _) in times.items() if name.split('.')[0] == 'core')
+    assert own_ms < int(os.environ.get('IMPORT_TIME_BUDGET_MS', 150)), own_ms
+    assert times['core.server'][1] < int(os.environ.get('COLD_START_BUDGET_MS', 2000)), times['core.server'][1]
+
+
+def test_create_app(tmp_path):
+    other = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///{0}'.format(tmp_path / 'other.sqlite3')})
+
+    with other.app_context():
+        db.create_all()
+        assert db.engine.url.database.endswith('other.sqlite3')
+        assert other.test_client().get('/student/assignments', headers={
+            'X-Principal': json.dumps({'student_id': 1, 'user_id': 1})
+        }).json == {'data': [], 'next_cursor': None}
+        db.get_engine(other).dispose()
+
+    assert not db.engine.url.database.endswith('other.sqlite3')
+
+
+def test_create_app_keeps_the_settings_of_other_apps(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'COMPRESSION_MIN_SIZE', 1)
+    monkeypatch.setattr(config, 'RATE_LIMIT_FILE', str(tmp_path / 'rate-limits'))
+    monkeypatch.setattr(config, 'DATABASE_REPLICA_URLS', ['sqlite:///{0}'.format(tmp_path / 'replica.sqlite3')])
+    before = dict(app.extensions), dict(app.config.get('SQLALCHEMY_BINDS') or {})
+
+    other = create_app()
+
+    assert other.extensions['compression'].min_size == 1
+    assert other.extensions['rate_limit'] is not None
+    assert other.extensions['replicas'].names == ['replica_0']
+    for name in ('compression', 'rate_limit', 'replicas'):
+        assert app.extensions[name] is before[0][name]
+    assert (app.config.get('SQLALCHEMY_BINDS') or {}) == before[1]
+    with app.app_context():
+        assert db.replicas is app.extensions['replicas']
+    with other.app_context():
+        assert db.replicas is other.extensions['replicas']
+
+
+def test_rate_limiter_is_shared_by_processes(tmp_path):
+    path = str(tmp_path / 'rate-limits')
+    limiter = rate_limit.RateLimiter(path, capacity=3, refill_rate=0.01)
+
+    assert [limiter.take(1) for _ in range(3)] == [0, 0, 0]
+    assert 99 < limiter.take(1) <= 100
+    assert limiter.take(2, cost=3) == 0
+
+    other_worker = subprocess.run(
+        [sys.executable, '-c', 'from core.libs.rate_limit import RateLimiter; '
+                               'print(RateLimiter({0!r}, 3, 0.01).take(1, cost=2))'.format(path)],
+        capture_output=True, text=True, check=True)
+    assert 190 < float(other_worker.stdout) <= 200
+
+
+def test_rate_limited_route(client, h_principal, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.extensions, 'rate_limit', rate_limit.RateLimiter(str(tmp_path / 'rate-limits'), 2, 0.5))
+
+    assert [client.get('/principal/teachers', headers=h_principal).status_code for _ in range(2)] == [200, 200]
+    response = client.get('/principal/teachers', headers=h_principal)
+
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '2'
+    assert response.json['error'] == 'RateLimitExceeded'
+    assert client.get('/student/assignments', headers={
+        'X-Principal': json.dumps({'student_id': 1, 'user_id': 1})
+    }).status_code == 200
+
+
+GUNICORN_HOOKS = """
+import logging, os, sys
+import core.libs.green
+from core.libs.helpers import GeneralObject
+sys.path.insert(0, '.')
+import gunicorn_config
+
+log = logging.getLogger('gunicorn.test')
+server, worker = GeneralObject(log=log), GeneralObject(log=log, pid=os.getpid())
+# as in a gevent worker: core is imported by the patching, the app is not built yet
+gunicorn_config.post_fork(server, worker)
+gunicorn_config.worker_exit(server, worker)
+
+from core.server import app
+from core.libs.db_pool import pool_stats
+app.test_client().get('/')
+gunicorn_config.post_fork(server, worker)
+assert pool_stats.snapshot()['checkouts'] == 0
+gunicorn_config.worker_exit(server, worker)
+print('ok')
+"""
+
+
+def test_gunicorn_worker_hooks(tmp_path):
+    result = subprocess.run([sys.executable, '-c', GUNICORN_HOOKS], capture_output=True, text=True,
+                            env=dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path), RATE_LIMIT_FILE=''))
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == 'ok'
@@ -1,5 +1,13 @@
+import json
+import threading
+import time
+import uuid
+import pytest
+from sqlalchemy import event
 from core import db
-from core.models.assignments import AssignmentStateEnum
+from core import config
+from core.models.assignments import Assignment, AssignmentStateEnum
+from core.models.idempotency_keys import IdempotencyKey
 from core.models.users import User
 
 def test_get_assignments_student_1(client, h_student_1):
@@ -224,3 +232,221 @@ def test_student_create_empty_assignment(client, h_student_1):
         })
     assert response.status_code == 200  # Changed from 400 to 200
 
+
+def test_get_assignments_paginated(client, h_student_1, delete_created_assignments):
+    for _ in range(3):
+        client.post('/student/assignments', headers=h_student_1, json={'content': 'Paginated assignment'})
+
+    full_response = client.get('/student/assignments', headers=h_student_1, query_string={'limit': 500})
+    assert full_response.status_code == 200
+    assert full_response.json['next_cursor'] is None
+    all_ids = [assignment['id'] for assignment in full_response.json['data']]
+
+    paged_ids = []
+    cursor = None
+    while True:
+        query_string = {'limit': 2}
+        if cursor:
+            query_string['cursor'] = cursor
+        response = client.get('/student/assignments', headers=h_student_1, query_string=query_string)
+        assert response.status_code == 200
+        assert len(response.json['data']) <= 2
+        paged_ids.extend(assignment['id'] for assignment in response.json['data'])
+        cursor = response.json['next_cursor']
+        if cursor is None:
+            break
+
+    assert paged_ids == all_ids
+
+
+def test_get_assignments_invalid_cursor(client, h_student_1):
+    response = client.get('/student/assignments', headers=h_student_1, query_string={'cursor': 'not-a-cursor'})
+    assert response.status_code == 400
+    assert response.json['message'] == 'invalid cursor'
+
+
+def test_get_assignments_invalid_limit(client, h_student_1):
+    response = client.get('/student/assignments', headers=h_student_1, query_string={'limit': 0})
+    assert response.status_code == 400
+
+    response = client.get('/student/assignments', headers=h_student_1, query_string={'limit': '\u00b2'})
+    assert response.status_code == 400
+
+    # the principal is checked before the query string
+    response = client.get('/student/assignments', query_string={'limit': 0})
+    assert response.status_code == 401
+
+
+def test_bulk_upsert_assignments(client, h_student_1, h_student_2, delete_created_assignments):
+    existing_id = client.post('/student/assignments', headers=h_student_1,
+                              json={'content': 'Draft to be edited in bulk'}).json['data']['id']
+    other_students_id = client.post('/student/assignments', headers=h_student_2,
+                                    json={'content': 'Draft of another student'}).json['data']['id']
+
+    response = client.post(
+        '/student/assignments/bulk',
+        headers=h_student_1,
+        json=[
+            {'content': 'Bulk draft 1'},
+            {'id': existing_id, 'content': 'Edited in bulk'},
+            {'content': None},
+            {'content': 'Bulk draft 2'},
+            {'id': other_students_id, 'content': 'Not mine'},
+        ])
+    assert response.status_code == 200
+
+    upserted = response.json['data']['upserted']
+    assert [assignment['content'] for assignment in upserted] == ['Edited in bulk', 'Bulk draft 1', 'Bulk draft 2']
+    assert upserted[0]['id'] == existing_id
+    for assignment in upserted:
+        assert assignment['student_id'] == 1
+        assert assignment['state'] == AssignmentStateEnum.DRAFT.value
+
+    failures = response.json['data']['failures']
+    assert failures[0]['index'] == 2
+    assert failures[1]['id'] == other_students_id
+    assert failures[1]['message'] == 'This assignment belongs to some other student'
+
+def test_bulk_submit_assignments(client, h_student_1, delete_created_assignments):
+    draft_ids = [
+        assignment['id'] for assignment in client.post(
+            '/student/assignments/bulk',
+            headers=h_student_1,
+            json=[{'content': 'Bulk submit 1'}, {'content': 'Bulk submit 2'}, {'content': 'Bulk submit 3'}]
+        ).json['data']['upserted']
+    ]
+
+    response = client.post(
+        '/student/assignments/submit/bulk',
+        headers=h_student_1,
+        json=[
+            {'id': draft_ids[0], 'teacher_id': 1},
+            {'id': draft_ids[1], 'teacher_id': 2},
+            {'id': draft_ids[2], 'teacher_id': 9999},
+            {'id': draft_ids[0], 'teacher_id': 2},
+        ])
+    assert response.status_code == 200
+
+    submitted = response.json['data']['submitted']
+    assert [(assignment['id'], assignment['teacher_id']) for assignment in submitted] == \
+        [(draft_ids[0], 1), (draft_ids[1], 2)]
+    assert all(assignment['state'] == AssignmentStateEnum.SUBMITTED.value for assignment in submitted)
+
+    failures = response.json['data']['failures']
+    assert failures[0] == {'index': 3, 'error': 'ValidationError', 'message': 'duplicate id in batch'}
+    assert failures[1]['id'] == draft_ids[2]
+
+    resubmit_response = client.post(
+        '/student/assignments/submit/bulk',
+        headers=h_student_1,
+        json=[{'id': draft_ids[0], 'teacher_id': 1}])
+    assert resubmit_response.json['data']['failures'][0]['message'] == 'only a draft assignment can be submitted'
+
+
+def test_get_assignments_fields(client, h_student_1):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.get('/student/assignments?fields=id,state,grade', headers=h_student_1)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    assert response.status_code == 200
+    data = response.json['data']
+    assert len(data) > 0
+    assert all(set(assignment) == {'id', 'state', 'grade'} for assignment in data)
+    page_select = next(statement for statement in statements if 'ORDER BY' in statement)
+    assert 'assignments.content' not in page_select
+
+    streamed = client.get('/student/assignments?fields=id,state,grade',
+                          headers=dict(h_student_1, Accept='application/x-ndjson'))
+    assert [json.loads(line) for line in streamed.data.splitlines()] == data
+
+
+def test_get_assignments_unknown_field(client, h_student_1):
+    response = client.get('/student/assignments?fields=id,secret', headers=h_student_1)
+
+    assert response.status_code == 400
+    assert response.json['message'] == 'unknown fields: secret'
+
+
+def test_get_assignments_empty_field(client, h_student_1):
+    for fields in (',', 'id,,state'):
+        response = client.get('/student/assignments', headers=h_student_1, query_string={'fields': fields})
+
+        assert response.status_code == 400
+        assert response.json['message'] == 'fields should be a comma separated list of field names'
+
+
+@pytest.fixture
+def new_idempotency_key():
+    """Hands out unique keys, their rows are deleted after the test"""
+    keys = []
+
+    def new_key():
+        keys.append(str(uuid.uuid4()))
+        return keys[-1]
+
+    yield new_key
+
+    table = IdempotencyKey.__table__
+    with db.engine.begin() as connection:
+        connection.execute(table.delete().where(table.c.key.in_(keys)))
+
+
+def test_idempotency_key_replays_the_first_response(client, h_student_1, new_idempotency_key,
+                                                    delete_created_assignments):
+    key = new_idempotency_key()
+    headers = dict(h_student_1, **{'Idempotency-Key': key})
+    payload = {'content': 'idempotent draft {0}'.format(key)}
+
+    first = client.post('/student/assignments', headers=headers, json=payload)
+    retry = client.post('/student/assignments', headers=headers, json=payload)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.data == first.data
+    assert retry.headers['Idempotent-Replayed'] == 'true' and 'Idempotent-Replayed' not in first.headers
+    assert Assignment.filter(Assignment.content == payload['content']).count() == 1
+
+    other_body = client.post('/student/assignments', headers=headers, json={'content': 'another draft'})
+    assert other_body.status_code == 400
+    assert other_body.json['message'] == 'Idempotency-Key was already used with a different request'
+
+
+def test_idempotency_key_released_on_error(client, h_student_1, new_idempotency_key):
+    key = new_idempotency_key()
+    headers = dict(h_student_1, **{'Idempotency-Key': key})
+    payload = {'id': 100000, 'teacher_id': 1}
+
+    assert client.post('/student/assignments/submit', headers=headers, json=payload).status_code == 404
+    assert IdempotencyKey.get(1, key) is None
+    assert client.post('/student/assignments/submit', headers=headers, json=payload).status_code == 404
+
+
+def test_idempotency_key_retry_waits_for_the_request_in_flight(client, h_student_1, monkeypatch,
+                                                               new_idempotency_key):
+    key = new_idempotency_key()
+    headers = dict(h_student_1, **{'Idempotency-Key': key})
+    payload = {'content': 'in flight'}
+    fingerprint = IdempotencyKey.fingerprint_of('POST', '/student/assignments', json.dumps(payload).encode('utf-8'))
+    assert IdempotencyKey.claim(1, key, fingerprint, lock_timeout=60) is None
+
+    finisher = threading.Timer(0.2, IdempotencyKey.complete, (1, key, 201, b'{"data":"first"}\n', 60))
+    finisher.start()
+    started_at = time.monotonic()
+    response = client.post('/student/assignments', headers=headers, json=payload)
+    finisher.join()
+
+    assert time.monotonic() - started_at >= 0.2
+    assert response.status_code == 201 and response.json == {'data': 'first'}
+    assert Assignment.filter(Assignment.content == 'in flight').count() == 0
+
+    monkeypatch.setattr(config, 'IDEMPOTENCY_WAIT_TIMEOUT', 0.1)
+    key = new_idempotency_key()
+    assert IdempotencyKey.claim(1, key, fingerprint, lock_timeout=60) is None
+    response = client.post('/student/assignments', headers=dict(headers, **{'Idempotency-Key': key}), json=payload)
+    assert response.status_code == 409
@@ -1,4 +1,5 @@
 import json
+from sqlalchemy import event
 from core import db
 from core.models.assignments import Assignment, AssignmentStateEnum, GradeEnum
 
@@ -253,4 +254,110 @@ def test_teacher_grade_other_teachers_assignment(client, h_teacher_1, h_teacher_
     )
     assert grade_response.status_code == 400
     assert 'error' in grade_response.json
-    assert 'This assignment belongs to some other teacher' in grade_response.json['message']
\ No newline at end of file
+    assert 'This assignment belongs to some other teacher' in grade_response.json['message']
+
+
+def test_get_assignments_streamed(client, h_teacher_2):
+    response = client.get('/teacher/assignments', headers=h_teacher_2, query_string={'limit': 500})
+    assert response.status_code == 200
+
+    streamed_response = client.get(
+        '/teacher/assignments',
+        headers={**h_teacher_2, 'Accept': 'application/x-ndjson'}
+    )
+    assert streamed_response.status_code == 200
+    assert streamed_response.mimetype == 'application/x-ndjson'
+
+    streamed = [json.loads(line) for line in streamed_response.get_data(as_text=True).splitlines()]
+    assert streamed == response.json['data']
+
+    query_param_response = client.get('/teacher/assignments', headers=h_teacher_2, query_string={'stream': 1})
+    assert query_param_response.get_data() == streamed_response.get_data()
+
+def test_bulk_grade_assignments(client, h_teacher_1, h_student_1, delete_created_assignments):
+    def create_submitted_assignment(teacher_id):
+        create_response = client.post(
+            '/student/assignments',
+            headers=h_student_1,
+            json={'content': 'Assignment for bulk grading'})
+        assignment_id = create_response.json['data']['id']
+        client.post(
+            '/student/assignments/submit',
+            headers=h_student_1,
+            json={'id': assignment_id, 'teacher_id': teacher_id})
+        return assignment_id
+
+    first_id = create_submitted_assignment(1)
+    second_id = create_submitted_assignment(1)
+    other_teachers_id = create_submitted_assignment(2)
+
+    response = client.post(
+        '/teacher/assignments/grade/bulk',
+        headers=h_teacher_1,
+        json=[
+            {'id': first_id, 'grade': GradeEnum.A.value},
+            {'id': second_id, 'grade': GradeEnum.C.value},
+            {'id': other_teachers_id, 'grade': GradeEnum.B.value},
+            {'id': 100000, 'grade': GradeEnum.B.value},
+            {'id': first_id, 'grade': GradeEnum.D.value},
+            {'id': second_id, 'grade': 'AB'},
+        ]
+    )
+    assert response.status_code == 200
+
+    graded = {assignment['id']: assignment for assignment in response.json['data']['graded']}
+    assert set(graded) == {first_id, second_id}
+    assert graded[first_id]['grade'] == GradeEnum.A.value
+    assert graded[second_id]['grade'] == GradeEnum.C.value
+    assert all(assignment['state'] == AssignmentStateEnum.GRADED.value for assignment in graded.values())
+
+    failures = response.json['data']['failures']
+    assert {failure['index'] for failure in failures if 'index' in failure} == {4, 5}
+    failures_by_id = {failure['id']: failure for failure in failures if 'id' in failure}
+    assert failures_by_id[other_teachers_id]['message'] == 'This assignment belongs to some other teacher'
+    assert failures_by_id[100000]['status_code'] == 404
+
+    regrade_response = client.post(
+        '/teacher/assignments/grade/bulk',
+        headers=h_teacher_1,
+        json=[{'id': first_id, 'grade': GradeEnum.B.value}]
+    )
+    assert regrade_response.json['data']['graded'] == []
+    assert regrade_response.json['data']['failures'][0]['message'] == 'only a submitted assignment can be graded'
+
+
+def test_bulk_grade_statements_do_not_grow_with_the_batch(client, h_teacher_1, h_student_1,
+                                                          delete_created_assignments):
+    def statements_to_grade(count):
+        ids = []
+        for _ in range(count):
+            assignment_id = client.post('/student/assignments', headers=h_student_1,
+                                        json={'content': 'Assignment for counting'}).json['data']['id']
+            client.post('/student/assignments/submit', headers=h_student_1,
+                        json={'id': assignment_id, 'teacher_id': 1})
+            ids.append(assignment_id)
+
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            response = client.post('/teacher/assignments/grade/bulk', headers=h_teacher_1,
+                                   json=[{'id': _id, 'grade': GradeEnum.A.value} for _id in ids])
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        assert len(response.json['data']['graded']) == count
+        return len(statements)
+
+    assert statements_to_grade(2) == statements_to_grade(10)
+
+
+def test_bulk_grade_assignments_not_a_list(client, h_teacher_1):
+    response = client.post(
+        '/teacher/assignments/grade/bulk',
+        headers=h_teacher_1,
+        json={'id': 1, 'grade': GradeEnum.A.value}
+    )
+    assert response.status_code == 400